@@ -1,7 +1,22 @@
+import json
+import time
 import pandas as pd
-import matplotlib.pyplot as plt
 import streamlit as st
 from io import BytesIO
+from dataclasses import replace
+from functools import partial, wraps
+from ingest import DatasetCache, file_key, load_dataset
+from readers import UPLOAD_TYPES, is_workbook, sheet_names
+from sidecar import SidecarStore
+from plotting import SCATTER_MAX_POINTS, figure_stats
+from plotspec import PlotSpec, Trace, dump_specs, load_specs, with_sheet
+from export import FORMATS, RENDER_CACHE_MAX_BYTES, ImageCache, export_bytes, render_pngs
+from batch import REPORT_FORMATS, spilled, write_report
+from interactive import chart_json
+from derived import FUNCTIONS
+from telemetry import BUCKETS, METRICS_HOST, METRICS_PORT, serve_metrics, telemetry, timed
+
+rerun_start = time.perf_counter()
 
 st.title('RF Engineering Data Dashboard')
 st.markdown(
@@ -16,29 +31,239 @@ st.markdown(
       
     Instructions:  
     Just drag and drop an excel file below. Ensure all columns have a header describing the data within that column, and all headers are in row 1.    
+    CSV exports and Touchstone (.sNp, .ts) files can be dropped in directly; instrument preamble lines above the CSV header are skipped.  
+    Switch Plot rendering to Interactive in the sidebar to pan and zoom in the browser; downloads are still drawn with matplotlib.  
+    Derived columns such as 20*log10(abs(S21)) can be added under the data preview and picked in every tab.  
+    To plot many files the same way, save the plot specs from the sidebar and build a batch report from them.  
     '''
 )
 
-uploaded_file = st.file_uploader("Choose a file", type="xlsx")
+@st.cache_resource
+def dataset_cache():
+    # One cache per server process, shared by every session and rerun.
+    return telemetry.register_cache('datasets', DatasetCache())
+
+@st.cache_resource
+def sidecar_store():
+    # Columnar copies of uploaded workbooks, reused by later sessions.
+    return telemetry.register_cache('sidecars', SidecarStore())
+
+@st.cache_resource
+def export_cache():
+    # Download files, keyed by dataset and plot spec.
+    return telemetry.register_cache('exports', ImageCache())
+
+@st.cache_resource
+def render_cache():
+    # On-screen images, keyed by dataset and plot spec.
+    return telemetry.register_cache('renders', ImageCache(RENDER_CACHE_MAX_BYTES))
+
+@st.cache_resource
+def metrics_server():
+    # Local /metrics and /metrics.json endpoint, one per server process.
+    telemetry.register_gauge('live_figures', lambda: figure_stats()['live'])
+    telemetry.register_gauge('live_figure_bytes', lambda: figure_stats()['live_bytes'])
+    telemetry.register_gauge('plot_source_bytes', lambda: figure_stats()['source_bytes'])
+    return serve_metrics()
+
+metrics_server()
+
+renderer = st.sidebar.radio('Plot rendering', ['Image', 'Interactive'], key='renderer', help='Interactive charts pan and zoom in the browser without rerunning the app.')
+export_format = st.sidebar.selectbox('Download format', list(FORMATS), key='export_format')
+export_dpi = st.sidebar.number_input('PNG resolution (dpi)', min_value=50, max_value=600, value=100, step=50, key='export_dpi')
+
+def open_sheets(names):
+    # Other sheets of the uploaded workbook, each parsed on first use and cached.
+    return {name: load_dataset(uploaded_file.getvalue(), dataset_cache(), key=st.session_state['file_key'], store=sidecar_store(), name=uploaded_file.name, sheet=name) for name in names}
+
+def plot_images(views, sheets=None):
+    # Interactive charts are drawn in the browser, so nothing is rasterized here.
+    if renderer == 'Interactive':
+        return [None] * len(views)
+    # Every session shares the render cache, so repeat views of the same
+    # file and settings are served without redrawing.
+    return render_pngs(dataset, [spec for spec, _ in views], render_cache(), sheets)
+
+def show_plot(png, spec, key, sheets=None):
+    if png is None:
+        chart = chart_json(dataset, spec, render_cache(), sheets)
+        with timed('display'):
+            st.plotly_chart(json.loads(chart), key=f'{key}_chart', config={'scrollZoom': True, 'displaylogo': False})
+    else:
+        with timed('display'):
+            st.image(png, width='stretch')
+    st.session_state['report_specs'][st.session_state['report_tab']][key] = with_sheet(spec, sheet)
+    # The file is only rendered when the button is clicked, and then cached.
+    _, ext, mime = FORMATS[export_format]
+    export = partial(export_bytes, dataset, spec, export_format, export_dpi, export_cache(), sheets)
+    st.download_button(label=f'Download plot as {export_format}', data=export,file_name=f'plot.{ext}',mime=mime,key=key)
+
+def show_spec(spec, key, zoomed=None, zoomed_key=None, sheets=None):
+    views = [(spec, key)] if zoomed is None else [(spec, key), (zoomed, zoomed_key)]
+    for (view, view_key), png in zip(views, plot_images(views, sheets)):
+        show_plot(png, view, view_key, sheets)
+
+def plot_tab(name):
+    # Each tab runs as a fragment, so a widget change inside it reruns only
+    # that tab; the others keep showing their last output.
+    def decorate(body):
+        @st.fragment
+        @wraps(body)
+        def run():
+            # The views shown by this run replace the tab's saved plot specs.
+            st.session_state.setdefault('report_specs', {})[name] = {}
+            st.session_state['report_tab'] = name
+            start = time.perf_counter()
+            body()
+            elapsed = time.perf_counter() - start
+            st.session_state.setdefault('tab_timings', {})[name] = elapsed
+            telemetry.observe(f'tab.{name}', elapsed)
+            st.caption(f'Rendered in {elapsed * 1000:.0f} ms')
+        return run
+    return decorate
+
+def show_performance(rerun_elapsed):
+    snap = telemetry.snapshot()
+    rss = f"{snap['rss_bytes'] / 1e6:,.0f} MB" if snap['rss_bytes'] is not None else 'n/a'
+    st.caption(f'Last rerun {rerun_elapsed * 1000:.0f} ms, process RSS {rss}')
+    timings = st.session_state.get('tab_timings', {})
+    if timings:
+        st.caption('Tab render times: ' + ', '.join(f'{name} {elapsed * 1000:.0f} ms' for name, elapsed in timings.items()))
+    if snap['stages']:
+        # Latencies of every session on this server, not just this one.
+        stages = pd.DataFrame(
+            [[s['count']] + [s[k] * 1000 for k in ('mean', 'p50', 'p95', 'max')] for s in snap['stages'].values()],
+            index=list(snap['stages']), columns=['count', 'mean ms', 'p50 ms', 'p95 ms', 'max ms'],
+        )
+        st.dataframe(stages.sort_index().round(1))
+        stage = st.selectbox('Latency histogram', sorted(snap['stages']), key='perf_stage')
+        cumulative = list(snap['stages'][stage]['buckets'].values())
+        counts = [n - m for n, m in zip(cumulative, [0] + cumulative[:-1])]
+        st.bar_chart(pd.Series(counts, index=[f'≤{b:g} s' for b in BUCKETS] + [f'>{BUCKETS[-1]:g} s']))
+    caches = pd.DataFrame.from_dict(snap['caches'], orient='index')
+    if not caches.empty:
+        st.dataframe(caches)
+    cache = render_cache()
+    st.caption(f'Render cache: {len(cache)} images ({cache.nbytes / 1e6:.1f} MB)')
+    stats = figure_stats()
+    st.caption(f"Figures: {stats['live']} live ({stats['live_bytes'] / 1024:.0f} KB), {stats['created']} created, {stats['closed']} closed")
+    st.caption(f"Zoom sources: {stats['sources']} traces ({stats['source_bytes'] / 1e6:.1f} MB of full-resolution data)")
+    if metrics_server() is not None:
+        st.caption(f'Metrics: http://{METRICS_HOST}:{METRICS_PORT}/metrics (Prometheus) and /metrics.json')
+
+def derived_columns():
+    # A derived column is named by its expression, so specs, caches and
+    # batch reports treat it like any other column. Values are computed
+    # only when a tab plots them, once per dataset.
+    derived = st.session_state.setdefault('derived', [])
+    with st.form('derived_form', clear_on_submit=True):
+        text = st.text_input('Expression', placeholder='20*log10(abs(S21))', key='derived_expression')
+        if st.form_submit_button('Add column') and text.strip():
+            try:
+                name = dataset.check_expression(text)
+            except (KeyError, ValueError) as exc:
+                st.error(f'Cannot add {text}: {exc.args[0]}')
+            else:
+                if name not in derived:
+                    derived.append(name)
+    st.caption('Functions: ' + ', '.join(FUNCTIONS) + '. d(y) / d(x) is the derivative of y with respect to x. Quote column names that are not single words in backticks, e.g. `` `S21 deg` ``.')
+    # Each expression is re-checked once per dataset; ones this file cannot
+    # evaluate are left out until a file that can is loaded.
+    problems = st.session_state.setdefault('derived_problems', {})
+    usable = []
+    for name in list(derived):
+        if (dataset.key, name) not in problems:
+            try:
+                dataset.check_expression(name)
+            except (KeyError, ValueError) as exc:
+                problems[dataset.key, name] = exc.args[0]
+            else:
+                problems[dataset.key, name] = None
+        col1, col2 = st.columns([4, 1])
+        col1.code(name, language=None)
+        if problems[dataset.key, name] is not None:
+            col1.caption(f'Not available for this file: {problems[dataset.key, name]}')
+        else:
+            usable.append(name)
+        if col2.button('Remove', key=f'remove_{name}'):
+            derived.remove(name)
+            usable = [n for n in usable if n != name]
+    return usable
+
+def saved_specs(report_specs):
+    return dump_specs([spec for views in report_specs.values() for spec in views.values()])
+
+@st.fragment
+def batch_report():
+    # The specs are read when the button is clicked, so they match what the tabs show.
+    report_specs = st.session_state.setdefault('report_specs', {})
+    st.download_button('Save plot specs', data=partial(saved_specs, report_specs), file_name='plot_specs.json', mime='application/json', key='save_specs')
+    spec_file = st.file_uploader('Plot specs', type=['json'], key='report_spec_file')
+    report_files = st.file_uploader('Files to plot', type=UPLOAD_TYPES, accept_multiple_files=True, key='report_files')
+    report_format = st.radio('Report format', list(REPORT_FORMATS), horizontal=True, key='report_format')
+    if st.button('Build report', disabled=not (spec_file and report_files), key='build_report'):
+        try:
+            specs = load_specs(spec_file.getvalue())
+        except (ValueError, TypeError, KeyError) as exc:
+            st.error(f'Could not read the plot specs: {exc}')
+            return
+        report = BytesIO()
+        with st.spinner(f'Drawing {len(specs) * len(report_files)} plots...'):
+            # Uploads go to disk next to the sidecars, so workers read only their own file.
+            with spilled([(f.name, f.getbuffer()) for f in report_files], sidecar_store().directory) as inputs:
+                skipped = write_report(report, specs, inputs, report_format, export_format, export_dpi, sidecar_dir=sidecar_store().directory)
+        st.session_state['report'] = (report_format, report.getvalue(), skipped)
+    if 'report' in st.session_state:
+        fmt, data, skipped = st.session_state['report']
+        ext, mime = REPORT_FORMATS[fmt]
+        st.download_button(f'Download report ({fmt})', data, file_name=f'report.{ext}', mime=mime, key='download_report')
+        for reason in skipped:
+            st.caption(f'Skipped {reason}')
+
+@st.fragment
+def show_preview():
+    # Only one page of rows is sent to the browser; paging reruns just this fragment.
+    with timed('preview'):
+        with st.expander('Column summary'):
+            st.dataframe(dataset.summary)
+        col1, col2 = st.columns(2)
+        page_size = col1.selectbox('Rows per page', [25, 100, 500], key='page_size')
+        pages = max(1, -(-dataset.num_rows // page_size))
+        page = col2.number_input(f'Page (of {pages:,})', min_value=1, max_value=pages, value=1, key='page')
+        start = (page - 1) * page_size
+        st.dataframe(dataset.rows(start, start + page_size).set_index(headers[0]))
+        st.caption(f'Rows {start + 1:,}-{min(dataset.num_rows, start + page_size):,} of {dataset.num_rows:,}')
+        if st.checkbox('Show full table', key='full_table'):
+            st.dataframe(dataset.preview)
+
+uploaded_file = st.file_uploader("Choose a file", type=UPLOAD_TYPES)
 
 if uploaded_file is not None:
-    df = pd.read_excel(uploaded_file)
-    headers = df.columns.tolist()
-    st.write(df.set_index(headers[0]))
+    # Hash the bytes once per upload; reruns reuse the key stored in the session.
+    if st.session_state.get('file_id') != uploaded_file.file_id:
+        st.session_state['file_id'] = uploaded_file.file_id
+        st.session_state['file_key'] = file_key(uploaded_file.getvalue())
+        telemetry.count('uploads')
+        # Sheet names come from the workbook metadata; no sheet is parsed yet.
+        st.session_state['sheets'] = sheet_names(uploaded_file.getvalue()) if is_workbook(uploaded_file.name) else []
+    sheets = st.session_state['sheets']
+    sheet = st.selectbox('Select sheet', sheets, key='sheet') if len(sheets) > 1 else None
+    dataset = load_dataset(uploaded_file.getvalue(), dataset_cache(), key=st.session_state['file_key'], store=sidecar_store(), name=uploaded_file.name, sheet=sheet)
+    with st.expander('Derived columns'):
+        derived = derived_columns()
+    headers = dataset.headers + derived
+    show_preview()
 else:
     st.write(' ')
 
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["Line plot", "Same X-axis", 'Same Y-axis','Two Y-axis', 'Scatter Plot'])
-
-with tab1:
+@plot_tab('Line plot')
+def line_plot_tab():
     col1, col2 = st.columns(2)
     with col1:
         if uploaded_file is not None:
-            df = pd.read_excel(uploaded_file)
-            headers = df.columns.tolist()
-
             x_column = st.selectbox('Select X-axis column', headers)
             y_column = st.selectbox('Select Y-axis column', headers)
+            df = dataset.frame([x_column, y_column])
             custom_title = st.text_input('Enter the title for the graph', 'Title1')
             x_label = st.text_input('Enter X-axis Label','X-Axis',key='x_axis_label')
             y_label = st.text_input('Enter Y-axis Label','Y-axis',key='y_axis_label')
@@ -55,51 +280,27 @@ with tab1:
     with col2:
         if uploaded_file is not None:
             if x_column and y_column:
-                fig, ax = plt.subplots()
-                ax.plot(df[x_column], df[y_column])
-                ax.grid(True)
-                ax.set_xlabel(x_label)
-                ax.set_ylabel(y_label)
-                ax.set_title(custom_title)
-                ax.set_xscale(X_scale)
-                ax.set_yscale(y_scale)
-                st.pyplot(fig)
-                buf = BytesIO()
-                fig.savefig(buf,format='png')
-                buf.seek(0)
-                st.download_button(label='Download plot as PNG', data=buf,file_name='plot.png',mime='image/png',key='button1')
-            if limits:
-                fig1, ax = plt.subplots()
-                ax.plot(df[x_column], df[y_column])
-                ax.grid(True)
-                ax.set_xlabel(x_label)
-                ax.set_ylabel(y_label)
-                ax.set_title(custom_title)
-                ax.set_xscale(X_scale)
-                ax.set_yscale(y_scale)
-                ax.set_xlim([x_min, x_max])
-                ax.set_ylim([y_min, y_max])
-                st.pyplot(fig1)
-                buf = BytesIO()
-                fig1.savefig(buf,format='png')
-                buf.seek(0)
-                st.download_button(label='Download plot as PNG', data=buf,file_name='plot.png',mime='image/png',key='button2')
+                spec = PlotSpec('line', (Trace(x_column, y_column),), custom_title, x_label, y_label, xscale=X_scale, yscale=y_scale)
+                zoomed = replace(spec, xlim=(x_min, x_max), ylim=(y_min, y_max)) if limits else None
+                show_spec(spec, 'button1', zoomed, 'button2')
         else:
             st.write('')
 
 
-with tab2:
+@plot_tab('Same X-axis')
+def same_x_tab():
     col1, col2 = st.columns(2)
     with col1:
         if uploaded_file is not None:
-        # Read the Excel file
-            df = pd.read_excel(uploaded_file)
-            headers = df.columns.tolist()
         # Select column for x-axis
             x_column = st.selectbox('Select X-axis column', headers, key='x_column')
         
         # Select columns for line plots
             selected_columns = st.multiselect('Select Y-Axis', headers, key='y_columns')
+            df = dataset.frame([x_column] + selected_columns)
+            overlay_sheets = []
+            if len(sheets) > 1:
+                overlay_sheets = st.multiselect('Overlay the same columns from sheets', [name for name in sheets if name != sheet], key='overlay_sheets')
 
             custom_title = st.text_input('Enter the title for the graph', 'Title',key='Title2')
             custom_xlabel = st.text_input('Enter X-axis Label','X-axis',key='x_axis_l')
@@ -117,52 +318,29 @@ with tab2:
     with col2:
         if uploaded_file is not None:
             if x_column and selected_columns:
-                fig, ax = plt.subplots()
-                for column in selected_columns:
-                    ax.plot(df[x_column], df[column], label=column)
-                ax.grid(True)
-                ax.set_xlabel(custom_xlabel)
-                ax.set_ylabel(custom_ylabel)
-                ax.set_title(custom_title)
-                ax.set_xscale(X_scale)
-                ax.set_yscale(y_scale)
-                ax.legend(loc='best',fontsize='small')
-                st.pyplot(fig)
-                buf = BytesIO()
-                fig.savefig(buf,format='png')
-                buf.seek(0)
-                st.download_button(label='Download plot as PNG', data=buf,file_name='plot.png',mime='image/png',key='button3')
+                # Overlaid sheets only load the X and Y columns picked here.
+                overlays = open_sheets(overlay_sheets)
+                suffix = f' ({sheet})' if overlays else ''
+                traces = [Trace(x_column, column, column + suffix) for column in selected_columns]
+                for name, overlay in overlays.items():
+                    if not overlay.missing([x_column]):
+                        traces += [Trace(x_column, column, f'{column} ({name})', sheet=name) for column in selected_columns if not overlay.missing([column])]
+                spec = PlotSpec('line', tuple(traces), custom_title, custom_xlabel, custom_ylabel, xscale=X_scale, yscale=y_scale, legend='best')
+                zoomed = replace(spec, xlim=(x_min, x_max), ylim=(y_min, y_max)) if limits else None
+                show_spec(spec, 'button3', zoomed, 'button4', overlays)
             else:
                 st.write('Please select data for the Y-axis')
-            if limits:
-                fig1, ax = plt.subplots()
-                for column in selected_columns:
-                    ax.plot(df[x_column], df[column], label=column)
-                ax.grid(True)
-                ax.set_xlabel(custom_xlabel)
-                ax.set_ylabel(custom_ylabel)
-                ax.set_title(custom_title)
-                ax.set_xscale(X_scale)
-                ax.set_yscale(y_scale)
-                ax.set_xlim([x_min, x_max])
-                ax.set_ylim([y_min, y_max])
-                ax.legend(loc='best',fontsize='small')
-                st.pyplot(fig1)
-                buf = BytesIO()
-                fig1.savefig(buf,format='png')
-                buf.seek(0)
-                st.download_button(label='Download plot as PNG', data=buf,file_name='plot.png',mime='image/png',key='button4')
         else: 
             st.write(" ")
 
-with tab3:
+@plot_tab('Same Y-axis')
+def same_y_tab():
     col1, col2 = st.columns(2)
     with col1:
         if uploaded_file is not None:
-            df = pd.read_excel(uploaded_file)
-            headers = df.columns.tolist()
             x_column = st.multiselect('Select X-axis', headers, key='x_columns')
             ycolumn = st.selectbox('Select Y-axis', headers, key='y_column')
+            df = dataset.frame(x_column + [ycolumn])
             custom_title = st.text_input('Enter the title for the graph', 'Title',key='Title3')
             custom_xlabel = st.text_input('Enter X-axis Label','X-axis',key='x_axis1')
             custom_ylabel = st.text_input('Enter Y-axis Label','Y-axis',key='y_axis1')
@@ -179,61 +357,29 @@ with tab3:
     with col2:
         if uploaded_file is not None:
         # Create line plots
-            if x_column and selected_columns:
-                fig, ax = plt.subplots()
-                for column in x_column:
-                    ax.plot(df[column], df[ycolumn], label=column)
-                ax.grid(True)
-                ax.set_xlabel(custom_xlabel)
-                ax.set_ylabel(custom_ylabel)
-                ax.set_title(custom_title)
-                ax.set_xscale(X_scale)
-                ax.set_yscale(y_scale)
-                ax.legend(loc='best', fontsize='small')
-                st.pyplot(fig)
-                buf = BytesIO()
-                fig.savefig(buf,format='png')
-                buf.seek(0)
-                st.download_button(label='Download plot as PNG', data=buf,file_name='plot.png',mime='image/png',key='button5')
-                if limits:
-                    fig1, ax = plt.subplots()
-                    for column in x_column:
-                        ax.plot(df[column], df[ycolumn], label=column)
-                    ax.grid(True)
-                    ax.set_xlabel(custom_xlabel)
-                    ax.set_ylabel(custom_ylabel)
-                    ax.set_title(custom_title)
-                    ax.set_xscale(X_scale)
-                    ax.set_yscale(y_scale)
-                    ax.set_xlim([x_min, x_max])
-                    ax.set_ylim([y_min, y_max])
-                    ax.legend(loc='best',fontsize='small')
-                    st.pyplot(fig1)
-                    buf = BytesIO()
-                    fig1.savefig(buf,format='png')
-                    buf.seek(0)
-                    st.download_button(label='Download plot as PNG', data=buf,file_name='plot.png',mime='image/png',key='button6')
+            if x_column and ycolumn:
+                traces = tuple(Trace(column, ycolumn, column) for column in x_column)
+                spec = PlotSpec('line', traces, custom_title, custom_xlabel, custom_ylabel, xscale=X_scale, yscale=y_scale, legend='best')
+                zoomed = replace(spec, xlim=(x_min, x_max), ylim=(y_min, y_max)) if limits else None
+                show_spec(spec, 'button5', zoomed, 'button6')
 
             else:
                 st.write('Please select data for X-axis')
         else: 
             st.write(" ")
 
-with tab4:
+@plot_tab('Two Y-axis')
+def two_y_tab():
     col1, col2 = st.columns(2)
     with col1:
         if uploaded_file is not None:
-            # Read the Excel file
-            df = pd.read_excel(uploaded_file)
-            headers = df.columns.tolist()
-            
             # Select Data
             num_lines = st.number_input('Enter number of lines to plot', min_value=1, max_value=10, value=1)
             x_columns = []
             y_columns = []
             x2_columns = []
             y2_columns = []
-            labels =[]
+            traces = []
             secondary_axis = []
             for i in range(num_lines):
                 x = st.selectbox(f'Select X-axis column for line {i+1}',headers, key=f'x_column_{i}')
@@ -243,13 +389,13 @@ with tab4:
                 if Secondary:
                     x2_columns.append(x)
                     y2_columns.append(y)
-                    labels.append(label)
                     secondary_axis.append(True)
                 else:
                     x_columns.append(x)
                     y_columns.append(y)
-                    labels.append(label)
                     secondary_axis.append(False)
+                traces.append(Trace(x, y, label, Secondary))
+            df = dataset.frame(x_columns + y_columns + x2_columns + y2_columns)
 
         else:
             st.write('Waiting on file to be uploaded')
@@ -258,6 +404,8 @@ with tab4:
             custom_title = st.text_input('Enter the title for the graph', 'Title',key='Title4')
             custom_xlabel = st.text_input('Enter X-axis Label','X-axis',key='x_axis2')
             custom_ylabel = st.text_input('Enter Primary Y-axis Label','Y-axis',key='y_axis2')
+            custom_y2label = ''
+            legend2 = None
             if any(secondary_axis):
                 custom_y2label = st.text_input('Enter Seondary Y-axis Label', 'Secondary Y-axis',key='y2_axis')
             X_scale = st.selectbox('Select X-axis scale', ['linear', 'log'], key='x3_scale')
@@ -267,79 +415,38 @@ with tab4:
                 legend2 = st.selectbox('Select location of secondary legend',['best','upper right','upper left','upper center','lower right', 'lower left', 'lower center'],key='legend2')
             # Create line plots
             if x_columns and y_columns:
-                fig, ax1 = plt.subplots()
-                for i in range(len(x_columns)):
-                    ax1.plot(df[x_columns[i]], df[y_columns[i]],label=labels[i])
-                ax1.set_xlabel(custom_xlabel)
-                ax1.set_ylabel(custom_ylabel)
-                ax1.set_title(custom_title)
-                ax1.set_yscale(y_scale)
-                ax1.set_xscale(X_scale)
-                ax1.grid(True)
-
-                if x2_columns or y2_columns:
-                    ax2 = ax1.twinx()
-                    for i in range(len(x2_columns)):
-                        ax2.plot(df[x2_columns[i]], df[y2_columns[i]], linestyle='--', label=labels[i+len(x_columns)])
-                    ax2.set_ylabel(custom_y2label, color='blue')
-                    ax2.grid(linewidth=0.5)
-                    ax2.tick_params(axis='y',color='blue',labelcolor='blue')
-                    ax2.legend(loc=legend2, fontsize='small')
-                ax1.legend(loc=legend, fontsize='small')
-                st.pyplot(fig)
-                buf = BytesIO()
-                fig.savefig(buf,format='png')
-                buf.seek(0)
-                st.download_button(label='Download plot as PNG', data=buf,file_name='plot.png',mime='image/png',key='button7')
-            limits = st.toggle("Edit Axis", key='tab4')
-            if limits:
-                x_min = st.number_input('Enter minimum x-axis limit', value=float(df[x_columns[0]].min()),key='plot3_x1')
-                x_max = st.number_input('Enter maximum x-axis limit', value=float(df[x_columns[0]].max()), key='plot3_x2')
-                y_min = st.number_input('Enter minimum y-axis limit', value=float(df[y_columns[0]].min()),key='plot3_y1')
-                y_max = st.number_input('Enter maximum y-axis limit', value=float(df[y_columns[0]].max()),key='plot3_y2')
-                if any(secondary_axis):
-                    y2_min = st.number_input('Enter minimum secondary y-axis limit', value=float(df[y2_columns[0]].min()),key='plot3_y3')
-                    y2_max = st.number_input('Enter maximum secondary y-axis limit', value=float(df[y2_columns[0]].max()),key='plot3_y4')
-                if x_columns and y_columns:
-                    fig, ax1 = plt.subplots()
-                    for i in range(len(x_columns)):
-                        ax1.plot(df[x_columns[i]], df[y_columns[i]],label=labels[i])
-                    ax1.set_xlabel(custom_xlabel)
-                    ax1.set_ylabel(custom_ylabel)
-                    ax1.set_title(custom_title)
-                    ax1.set_yscale(y_scale)
-                    ax1.set_xscale(X_scale)
-                    ax1.set_xlim([x_min, x_max])
-                    ax1.set_ylim([y_min, y_max])
-                    ax1.grid(True)
-
-                if x2_columns or y2_columns:
-                    ax2 = ax1.twinx()
-                    for i in range(len(x2_columns)):
-                        ax2.plot(df[x2_columns[i]], df[y2_columns[i]], linestyle='--', label=labels[i+len(x_columns)])
-                    ax2.set_ylabel(custom_y2label, color='blue')
-                    ax2.grid(linewidth=0.5)
-                    ax2.tick_params(axis='y',color='blue',labelcolor='blue')
-                    ax2.set_ylim([y2_min,y2_max])
-                    ax2.legend(loc=legend2, fontsize='small')
-                ax1.legend(loc=legend, fontsize='small')
-                st.pyplot(fig)
-                buf = BytesIO()
-                fig.savefig(buf,format='png')
-                buf.seek(0)
-                st.download_button(label='Download plot as PNG', data=buf,file_name='plot.png',mime='image/png',key='button8')
+                spec = PlotSpec('line', tuple(traces), custom_title, custom_xlabel, custom_ylabel, custom_y2label, X_scale, y_scale, legend, legend2)
+                plot_area = st.container()
+                limits = st.toggle("Edit Axis", key='tab4')
+                views = [(spec, 'button7')]
+                if limits:
+                    x_min = st.number_input('Enter minimum x-axis limit', value=float(df[x_columns[0]].min()),key='plot3_x1')
+                    x_max = st.number_input('Enter maximum x-axis limit', value=float(df[x_columns[0]].max()), key='plot3_x2')
+                    y_min = st.number_input('Enter minimum y-axis limit', value=float(df[y_columns[0]].min()),key='plot3_y1')
+                    y_max = st.number_input('Enter maximum y-axis limit', value=float(df[y_columns[0]].max()),key='plot3_y2')
+                    y2_limits = None
+                    if any(secondary_axis):
+                        y2_min = st.number_input('Enter minimum secondary y-axis limit', value=float(df[y2_columns[0]].min()),key='plot3_y3')
+                        y2_max = st.number_input('Enter maximum secondary y-axis limit', value=float(df[y2_columns[0]].max()),key='plot3_y4')
+                        y2_limits = (y2_min, y2_max)
+                    views.append((replace(spec, xlim=(x_min, x_max), ylim=(y_min, y_max), y2lim=y2_limits), 'button8'))
+                pngs = plot_images(views)
+                # The full view goes above the Edit Axis controls, the zoomed one below.
+                with plot_area:
+                    show_plot(pngs[0], *views[0])
+                if limits:
+                    show_plot(pngs[1], *views[1])
         else:
             st.write(' ')
 
-with tab5:
+@plot_tab('Scatter Plot')
+def scatter_tab():
     col1, col2 = st.columns(2)
     with col1:
         if uploaded_file is not None:
-            df = pd.read_excel(uploaded_file)
-            headers = df.columns.tolist()
-
             x_column = st.selectbox('Select X-axis column', headers, key='xs_column')
             y_column = st.selectbox('Select Y-axis column', headers, key='ys_column')
+            df = dataset.frame([x_column, y_column])
             custom_title = st.text_input('Enter the title for the graph', 'Title5')
             custom_xlabel = st.text_input('Enter X-axis Label','X-axis',key='xs_axis')
             custom_ylabel = st.text_input('Enter Y-axis Label','Y-axis',key='ys_axis')
@@ -356,38 +463,33 @@ with tab5:
     with col2:
         if uploaded_file is not None:
             if x_column and y_column:
-                fig, ax = plt.subplots()
-                ax.scatter(df[x_column], df[y_column])
-                ax.grid(True)
-                ax.set_xlabel(custom_xlabel)
-                ax.set_ylabel(custom_ylabel)
-                ax.set_title(custom_title)
-                ax.set_xscale(X_scale)
-                ax.set_yscale(y_scale)
-                st.pyplot(fig)
-
-                buf = BytesIO()
-                fig.savefig(buf,format='png')
-                buf.seek(0)
-
-                st.download_button(label='Download plot as PNG', data=buf,file_name='plot.png',mime='image/png',key='button9')
-
-            if limits:
-                fig1, ax = plt.subplots()
-                ax.scatter(df[x_column], df[y_column],label=y_column)
-                ax.grid(True)
-                ax.set_xlabel(custom_xlabel)
-                ax.set_ylabel(custom_ylabel)
-                ax.set_title(custom_title)
-                ax.set_yscale(y_scale)
-                ax.set_xlim([x_min, x_max])
-                ax.set_ylim([y_min, y_max])
-                st.pyplot(fig1)
-
-                buf = BytesIO()
-                fig1.savefig(buf,format='png')
-                buf.seek(0)
-
-                st.download_button(label='Download plot as PNG', data=buf,file_name='plot.png',mime='image/png',key='button10')
+                if len(df) > SCATTER_MAX_POINTS:
+                    st.caption(f'{len(df):,} points: showing point density')
+                spec = PlotSpec('scatter', (Trace(x_column, y_column),), custom_title, custom_xlabel, custom_ylabel, xscale=X_scale, yscale=y_scale)
+                zoomed = replace(spec, xlim=(x_min, x_max), ylim=(y_min, y_max)) if limits else None
+                show_spec(spec, 'button9', zoomed, 'button10')
         else:
-            st.write('')
\ No newline at end of file
+            st.write('')
+
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["Line plot", "Same X-axis", 'Same Y-axis','Two Y-axis', 'Scatter Plot'])
+
+with tab1:
+    line_plot_tab()
+with tab2:
+    same_x_tab()
+with tab3:
+    same_y_tab()
+with tab4:
+    two_y_tab()
+with tab5:
+    scatter_tab()
+
+with st.sidebar.expander('Batch report'):
+    batch_report()
+
+# Fragment reruns of a single tab are recorded by the tab's own stage.
+rerun_elapsed = time.perf_counter() - rerun_start
+telemetry.observe('rerun', rerun_elapsed)
+if st.sidebar.toggle('Performance panel', key='perf_panel'):
+    with st.sidebar.expander('Performance', expanded=True):
+        show_performance(rerun_elapsed)
\ No newline at end of file
@@ -0,0 +1,196 @@
+'''Render a saved list of plot specs for a set of workbooks into one report.
+
+    python batch.py plot_specs.json DUT1.xlsx DUT2.xlsx -o report.pdf
+    python batch.py plot_specs.json sweeps/*.s2p -o plots.zip --format SVG --workers 8
+
+The specs are the JSON file saved from the dashboard's sidebar. Every spec is
+drawn for every input file, one page (or ZIP entry) per pair, in input order.
+Plots are drawn on a process pool with the Agg backend, so the report builds
+without Streamlit and without a display.
+'''
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+
+import matplotlib
+from pypdf import PdfWriter
+
+from export import FORMATS, render_image
+from ingest import DatasetCache, cached_dataset, load_dataset, path_key, sheet_key
+from plotspec import load_specs, spec_frame
+from readers import is_workbook, sheet_names
+from sidecar import SIDECAR_DIR, SidecarStore
+from telemetry import timed
+
+# Report choice -> (file extension, MIME type)
+REPORT_FORMATS = {
+    'PDF': ('pdf', 'application/pdf'),
+    'ZIP': ('zip', 'application/zip'),
+}
+
+# Per-worker state, set up once by _init_worker().
+_files = {}
+_state = {}
+
+
+def _init_worker(files, sidecar_dir):
+    # Workers get only each file's path, key and sheet names; a task reads
+    # the file it needs, and only when neither cache nor sidecar has it.
+    matplotlib.use('Agg')
+    _files.update(files)
+    _state['cache'] = DatasetCache()
+    _state['store'] = SidecarStore(sidecar_dir) if sidecar_dir else None
+
+
+def _open(name, sheet=None):
+    path, key, sheets = _files[name]
+    ds = cached_dataset(key if sheet is None else sheet_key(key, sheets, sheet), _state['cache'], _state['store'])
+    if ds is not None:
+        return ds
+    with open(path, 'rb') as f:
+        data = f.read()
+    return load_dataset(data, _state['cache'], key=key, store=_state['store'], name=name, sheet=sheet)
+
+
+def _prepare(task):
+    # Parse each file (and sheet) once up front; with a sidecar store the
+    # render tasks then memory-map the parsed columns instead of re-parsing.
+    name, sheet = task
+    _open(name, sheet)
+
+
+def _render(task):
+    '''Draw one (file, spec) pair; returns (data, None) or (None, reason skipped).'''
+    name, index, spec, image_format, dpi, note = task
+    where = f'{name}, plot {index + 1}'
+    missing = [sheet for sheet in spec.sheet_columns if sheet not in _files[name][2]]
+    if missing:
+        return None, f'{where}: no sheet {missing[0]!r}'
+    dataset = _open(name)
+    sheets = {sheet: _open(name, sheet) for sheet in spec.sheet_columns}
+    needed = [(dataset, spec.columns)] + [(sheets[sheet], columns) for sheet, columns in spec.sheet_columns.items()]
+    for ds, columns in needed:
+        absent = ds.missing(columns)
+        if absent:
+            return None, f'{where}: no column {absent[0]!r}'
+    try:
+        frame = spec_frame(dataset, spec, sheets)
+    except ValueError as exc:
+        # A derived column that does not evaluate on this file.
+        return None, f'{where}: {exc}'
+    return render_image(spec, frame, image_format, dpi, note), None
+
+
+def _used_sheets(sheets, specs):
+    return sorted({sheet for spec in specs for sheet in spec.sheet_columns if sheet in sheets})
+
+
+def _entry_name(name, index, spec, ext):
+    title = re.sub(r'[^\w.-]+', '_', spec.title).strip('_') or 'plot'
+    return f'{os.path.splitext(name)[0]}/{index + 1:02d}_{title}.{ext}'
+
+
+@contextmanager
+def spilled(uploads, directory=SIDECAR_DIR):
+    '''Write uploaded (file name, bytes) pairs to a temporary directory under `directory`.
+
+    Yields the (file name, path) pairs write_report() takes, so uploads
+    reach the workers as paths rather than as pickled bytes.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='batch-', dir=directory) as spill:
+        inputs = []
+        for name, data in uploads:
+            path = os.path.join(spill, os.path.basename(name))
+            with open(path, 'wb') as f:
+                f.write(data)
+            inputs.append((name, path))
+        yield inputs
+
+
+def write_report(out, specs, inputs, report_format='PDF', image_format='PNG', dpi=100, workers=None, sidecar_dir=SIDECAR_DIR):
+    '''Draw every spec for every input and write the report to the binary file `out`.
+
+    `inputs` is a list of (file name, path); the name's extension picks the
+    reader. PDF reports get one page per plot, ZIP reports one `image_format`
+    file per plot. Plots whose columns or sheets a file lacks are skipped;
+    returns the list of reasons.
+    '''
+    names = [name for name, _ in inputs]
+    if len(set(names)) != len(names):
+        raise ValueError('input file names must be unique')
+    files = {name: (path, path_key(path), sheet_names(path) if is_workbook(name) else []) for name, path in inputs}
+    workers = workers or os.cpu_count() or 1
+    prepare = [(name, sheet) for name in names for sheet in [None] + _used_sheets(files[name][2], specs)]
+    pdf = report_format == 'PDF'
+    # For a PDF report every worker encodes finished one-page PDFs, which
+    # the parent only joins; each page is labelled with its file.
+    tasks = [
+        (name, index, spec, 'PDF' if pdf else image_format, dpi, name if pdf else None)
+        for name in names for index, spec in enumerate(specs)
+    ]
+    skipped = []
+    # Spawned rather than forked: the dashboard calls this from a threaded
+    # server, where fork can copy held locks into the workers.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, context, _init_worker, (files, sidecar_dir)) as pool:
+        list(pool.map(_prepare, prepare))
+        # Results arrive in task order while later plots are still drawing.
+        results = pool.map(_render, tasks)
+        if pdf:
+            report = PdfWriter()
+            for data, reason in results:
+                if data is None:
+                    skipped.append(reason)
+                    continue
+                with timed('report.join'):
+                    report.append(BytesIO(data))
+            with timed('report.join'):
+                report.write(out)
+        else:
+            ext = FORMATS[image_format][1]
+            # PNG and PDF are compressed already.
+            compression = zipfile.ZIP_DEFLATED if image_format == 'SVG' else zipfile.ZIP_STORED
+            with zipfile.ZipFile(out, 'w', compression) as report:
+                for (name, index, spec, *_), (data, reason) in zip(tasks, results):
+                    if data is None:
+                        skipped.append(reason)
+                        continue
+                    with timed('report.join'):
+                        report.writestr(_entry_name(name, index, spec, ext), data)
+    return skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('specs', help='plot specs saved from the dashboard (JSON)')
+    parser.add_argument('inputs', nargs='+', help='workbooks, CSV exports or Touchstone files')
+    parser.add_argument('-o', '--output', required=True, help='report file: .zip for one image per plot, otherwise a multi-page PDF')
+    parser.add_argument('--format', choices=list(FORMATS), default='PNG', help='image format inside a ZIP report')
+    parser.add_argument('--dpi', type=int, default=100, help='PNG resolution')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    args = parser.parse_args(argv)
+
+    with open(args.specs, encoding='utf-8') as f:
+        specs = load_specs(f.read())
+    names = [os.path.basename(path) for path in args.inputs]
+    if len(set(names)) != len(names):
+        parser.error('input file names must be unique')
+    inputs = list(zip(names, args.inputs))
+    report_format = 'ZIP' if args.output.lower().endswith('.zip') else 'PDF'
+    with open(args.output, 'wb') as out:
+        skipped = write_report(out, specs, inputs, report_format, args.format, args.dpi, args.workers)
+    for reason in skipped:
+        print(f'skipped {reason}', file=sys.stderr)
+    print(f'wrote {len(specs) * len(inputs) - len(skipped)} plots to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+'''Batch report build time against the number of worker processes.
+
+    python benchmarks/bench_batch.py --files 16 --points 500000
+
+Writes a set of CSV sweeps and a line, a twin-axis and a scatter spec, then
+builds the same PDF and ZIP report with 1, 2, 4, ... workers (up to the
+core count), each time with an empty sidecar directory. Also prints how
+much of each build the parent process spent joining the pages.
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from batch import write_report  # noqa: E402
+from plotspec import PlotSpec, Trace  # noqa: E402
+from telemetry import telemetry  # noqa: E402
+
+
+def make_inputs(directory, files, points):
+    rng = np.random.default_rng(0)
+    freq = np.linspace(10e6, 20e9, points)
+    inputs = []
+    for i in range(files):
+        df = pd.DataFrame({
+            'Frequency (Hz)': freq,
+            'S21 dB': -3 - 10 * np.log10(1 + freq / 1e9) + rng.normal(0, 0.2, points),
+            'S11 dB': -15 + 5 * np.sin(freq / 1e9) + rng.normal(0, 0.5, points),
+        })
+        path = os.path.join(directory, f'dut{i + 1:02d}.csv')
+        df.to_csv(path, index=False)
+        inputs.append((os.path.basename(path), path))
+    return inputs
+
+
+SPECS = [
+    PlotSpec('line', (Trace('Frequency (Hz)', 'S21 dB'),), 'Insertion loss', 'Frequency (Hz)', 'S21 (dB)'),
+    PlotSpec('line', (Trace('Frequency (Hz)', 'S21 dB', 'S21'), Trace('Frequency (Hz)', 'S11 dB', 'S11', True)),
+             'S21 and S11', 'Frequency (Hz)', 'S21 (dB)', 'S11 (dB)', legend='lower left', legend2='upper right'),
+    PlotSpec('scatter', (Trace('S21 dB', 'S11 dB'),), 'S11 vs S21', 'S21 (dB)', 'S11 (dB)'),
+]
+
+
+def joining_seconds():
+    return telemetry.snapshot()['stages'].get('report.join', {}).get('sum', 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=16)
+    parser.add_argument('--points', type=int, default=500_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as sweeps:
+        print(f'writing {args.files} sweeps of {args.points:,} points...')
+        inputs = make_inputs(sweeps, args.files, args.points)
+        cores = os.cpu_count() or 1
+        counts = sorted({min(cores, 2 ** i) for i in range(cores.bit_length() + 1)})
+        print(f'{len(SPECS) * args.files} plots per report, {cores} cores')
+        for report_format in ('PDF', 'ZIP'):
+            baseline = None
+            for workers in counts:
+                with tempfile.TemporaryDirectory() as directory:
+                    joined = joining_seconds()
+                    start = time.perf_counter()
+                    write_report(BytesIO(), SPECS, inputs, report_format, workers=workers, sidecar_dir=directory)
+                    elapsed = time.perf_counter() - start
+                    joined = joining_seconds() - joined
+                baseline = baseline or elapsed
+                # Joining the pages happens in the parent alone, so its share
+                # bounds the speedup more workers can give.
+                print(f'{report_format} {workers:3d} workers: {elapsed:7.2f} s  '
+                      f'speedup {baseline / elapsed:5.2f}x  efficiency {baseline / elapsed / workers:4.0%}  '
+                      f'parent {joined:5.2f} s ({joined / elapsed:4.0%})')
+
+if __name__ == '__main__':
+    main()
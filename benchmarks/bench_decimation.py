@@ -0,0 +1,106 @@
+'''Full-resolution vs. min/max-decimated line rendering.
+
+    python benchmarks/bench_decimation.py --points 2000000
+
+Times plotting (including decimation) plus PNG rasterization of a noisy
+sweep with spurs and notches on both paths, and checks visual fidelity by
+comparing the two rasters pixel by pixel, for the full view and for a
+zoomed window, on linear and log X axes. Then redraws a density scatter of
+the same size repeatedly and checks that the full-resolution data kept for
+zooming is released with each figure.
+'''
+import argparse
+import gc
+import os
+import sys
+import time
+from io import BytesIO
+
+import numpy as np
+from matplotlib.image import imread
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from plotting import RENDER_DPI, _sources, managed_figure, plot_line, plot_scatter, set_scatter_window, set_xwindow  # noqa: E402
+
+
+def make_trace(points):
+    rng = np.random.default_rng(0)
+    x = np.linspace(1e6, 6e9, points)
+    y = -20 * np.log10(1 + x / 1e9) + rng.normal(0, 0.2, points)
+    # Single-sample spurs and notches are exactly what decimation must keep.
+    spikes = rng.choice(points, 20, replace=False)
+    y[spikes[:10]] += 30
+    y[spikes[10:]] -= 30
+    return x, y
+
+
+def render(x, y, decimate, xscale='linear', xlim=None):
+    start = time.perf_counter()
+    with managed_figure() as fig:
+        ax = fig.subplots()
+        ax.set_xscale(xscale)
+        if decimate:
+            plot_line(ax, x, y)
+        else:
+            ax.plot(x, y)
+        ax.grid(True)
+        ax.set_ylim(y.min() - 1, y.max() + 1)
+        if xlim is not None:
+            if decimate:
+                set_xwindow(fig, xlim)
+            else:
+                ax.set_xlim(xlim)
+        buf = BytesIO()
+        fig.savefig(buf, format='png', dpi=RENDER_DPI)
+    elapsed = time.perf_counter() - start
+    buf.seek(0)
+    return elapsed, imread(buf)
+
+
+def render_density(x, y, xlim):
+    with managed_figure() as fig:
+        ax = fig.subplots()
+        plot_scatter(ax, x, y, max_points=len(x) - 1)
+        set_scatter_window(ax, xlim, None)
+        fig.savefig(BytesIO(), format='png', dpi=RENDER_DPI)
+
+
+def check_sources(x, y, renders=5):
+    # Each render stands for a title or limit change on a large scatter plot.
+    gc.collect()
+    before = len(_sources)
+    for i in range(renders):
+        render_density(x, y, (x[0], x[len(x) // (i + 2)]))
+    gc.collect()
+    return len(_sources) - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    x, y = make_trace(args.points)
+    zoom = (x[len(x) // 3], x[len(x) // 3 + len(x) // 100])
+    print(f'{args.points:,} points')
+    for xscale in ('linear', 'log'):
+        for name, xlim in (('full view', None), ('1% zoom', zoom)):
+            full_s, full_img = render(x, y, False, xscale, xlim)
+            dec_s, dec_img = render(x, y, True, xscale, xlim)
+            differing = np.any(np.abs(full_img - dec_img) > 0.25, axis=-1)
+            # The left quarter of the trace's own pixels, where a log axis
+            # stretches the fewest samples over the most columns.
+            trace = np.any(np.minimum(full_img, dec_img)[..., :3] < 0.5, axis=-1)
+            left = trace[:, :trace.shape[1] // 4]
+            left_differing = (differing[:, :left.shape[1]] & left).sum() / max(1, left.sum())
+            print(f'{xscale:>6} {name:>9}: full {full_s:7.3f} s, decimated {dec_s:7.3f} s, '
+                  f'differing pixels {differing.mean():.3%}, left-quarter trace pixels {left_differing:.3%}')
+            assert differing.mean() < 0.01, 'decimated raster diverges from full resolution'
+            assert left_differing < 0.1, 'decimated trace diverges where the axis stretches it'
+    leaked = check_sources(x, y)
+    print(f'density scatter: {leaked} source arrays left after 5 redraws')
+    assert leaked == 0, 'closed figures keep their full-resolution data'
+
+
+if __name__ == '__main__':
+    main()
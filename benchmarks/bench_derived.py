@@ -0,0 +1,71 @@
+'''Derived column evaluation against the same computation written in NumPy.
+
+    python benchmarks/bench_derived.py --rows 2000000
+
+Builds a sweep with a complex S21 column, evaluates typical derived
+columns through a Dataset the way a tab asks for them, and checks each
+against hand-written NumPy. Also checks number literals that NumPy integer
+arithmetic would get wrong, and expressions that must be rejected.
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from derived import compile_expression  # noqa: E402
+from ingest import Dataset  # noqa: E402
+
+
+def make_dataset(rows):
+    rng = np.random.default_rng(0)
+    f = np.linspace(10e6, 20e9, rows)
+    s21 = 10 ** (-(3 + 10 * np.log10(1 + f / 1e9)) / 20) * np.exp(-2j * np.pi * f * 1e-9)
+    s21 = s21 * (1 + rng.normal(0, 0.01, rows))
+    return Dataset('bench', pd.DataFrame({'f': f, 'S21': s21}))
+
+
+def expected(df):
+    f = df['f'].to_numpy()
+    s21 = df['S21'].to_numpy()
+    return {
+        '20 * log10(abs(S21))': 20 * np.log10(np.abs(s21)),
+        'f * 10 ** -9': f / 1e9,
+        '-d(unwrap(angle(S21))) / d(2 * pi * f)': -np.gradient(np.unwrap(np.angle(s21))) / np.gradient(2 * np.pi * f),
+        '2 ** 70 + 0 * f': np.full(len(f), 2.0 ** 70),
+    }
+
+
+# Each of these must raise ValueError rather than evaluate.
+REJECTED = ['abs(f, S21)', 'log10(f, f)', 'polar(f)', 'd(f, f)', 'f ^ 2', '1' + '0' * 400]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    dataset = make_dataset(args.rows)
+    print(f'{args.rows:,} rows')
+    for text, reference in expected(dataset.df).items():
+        start = time.perf_counter()
+        values = dataset.frame([text]).iloc[:, 0].to_numpy()
+        elapsed = time.perf_counter() - start
+        print(f'{text:>42}: {elapsed:7.3f} s')
+        assert np.allclose(values, reference, equal_nan=True), f'{text} disagrees with NumPy'
+    overflow = compile_expression('10 ** 10 ** 100').evaluate({}, 1)
+    assert np.isinf(overflow).all(), '10 ** 10 ** 100 must overflow to inf'
+    for text in REJECTED:
+        try:
+            compile_expression(text)
+        except ValueError:
+            continue
+        raise AssertionError(f'{text} was accepted')
+    print(f'{len(REJECTED)} invalid expressions rejected')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+'''Ingestion time for the same sweep saved as xlsx, CSV and Touchstone.
+
+    python benchmarks/bench_formats.py --points 200000
+
+Writes one two-port sweep (frequency plus S11/S21/S12/S22 in dB/angle) in
+each format and times the dashboard's reader for it, with the peak memory
+allocated while parsing. A three-port Touchstone v2 file, with its
+[Reference] impedances wrapped over two lines, is read the same way.
+'''
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from readers import read_upload  # noqa: E402
+
+PARAMS = ['S11', 'S21', 'S12', 'S22']
+# Touchstone v2 network data is row-major for any port count.
+PARAMS_3PORT = [f'S{i}{j}' for i in range(1, 4) for j in range(1, 4)]
+
+
+def make_sweep(points, params=PARAMS):
+    rng = np.random.default_rng(0)
+    data = {'Frequency (Hz)': np.linspace(10e6, 20e9, points)}
+    for name in params:
+        data[f'{name} dB'] = rng.normal(-10, 3, points).round(4)
+        data[f'{name} deg'] = rng.uniform(-180, 180, points).round(3)
+    return pd.DataFrame(data)
+
+
+def to_files(df):
+    xlsx = BytesIO()
+    df.to_excel(xlsx, index=False)
+    csv = df.to_csv(index=False).encode()
+    lines = ['! generated sweep', '# Hz S DB R 50']
+    lines += [' '.join(f'{v:.10g}' for v in row) for row in df.to_numpy()]
+    touchstone = '\n'.join(lines).encode()
+    return {'sweep.xlsx': xlsx.getvalue(), 'sweep.csv': csv, 'sweep.s2p': touchstone}
+
+
+def to_touchstone_v2(df, ports=3):
+    lines = [
+        '[Version] 2.0', '# Hz S DB R 50', f'[Number of Ports] {ports}',
+        # Impedances wrapped onto a second line, as the v2 format allows.
+        '[Reference] ' + ' '.join(['50'] * (ports - 1)), '50',
+        f'[Number of Frequencies] {len(df)}', '[Network Data]',
+    ]
+    # One line per matrix row, the frequency leading the first.
+    per_line = 2 * ports
+    for row in df.to_numpy():
+        cells = [f'{v:.10g}' for v in row[1:]]
+        lines.append(f'{row[0]:.10g} ' + ' '.join(cells[:per_line]))
+        lines += [' '.join(cells[k:k + per_line]) for k in range(per_line, len(cells), per_line)]
+    lines.append('[End]')
+    return '\n'.join(lines).encode()
+
+
+def measure(data, name):
+    start = time.perf_counter()
+    df = read_upload(data, name)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    read_upload(data, name)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f'writing a {args.points:,}-point sweep in each format...')
+    files = to_files(make_sweep(args.points))
+    files['sweep_v2.s3p'] = to_touchstone_v2(make_sweep(args.points, PARAMS_3PORT))
+    baseline = None
+    for name, data in files.items():
+        elapsed, peak, df = measure(data, name)
+        baseline = baseline or elapsed
+        print(f'{name:>12}: {len(data) / 1e6:7.1f} MB file, {elapsed:7.3f} s '
+              f'({baseline / elapsed:5.1f}x vs xlsx), peak {peak / 1e6:7.1f} MB, '
+              f'{df.shape[1]} columns')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+'''Cold xlsx load vs. warm Feather sidecar load.
+
+    python benchmarks/bench_sidecar.py --rows 1000000
+
+Generates a sweep-shaped workbook, parses it the way the dashboard does on
+first upload (writing the sidecar), then reopens it the way a later session
+does and reads only an X/Y column pair.
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ingest import DatasetCache, load_dataset  # noqa: E402
+from sidecar import SidecarStore  # noqa: E402
+
+
+def make_workbook(rows, cols):
+    freq = np.linspace(1e6, 6e9, rows)
+    data = {'Frequency (Hz)': freq}
+    rng = np.random.default_rng(0)
+    for i in range(cols - 1):
+        data[f'S{i + 1}1 (dB)'] = -3 * i - 10 * np.log10(1 + freq / 1e9) + rng.normal(0, 0.05, rows)
+    buf = tempfile.SpooledTemporaryFile()
+    pd.DataFrame(data).to_excel(buf, index=False, engine='openpyxl')
+    buf.seek(0)
+    return buf.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--cols', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f'generating {args.rows:,} x {args.cols} workbook...')
+    data = make_workbook(args.rows, args.cols)
+    print(f'workbook size: {len(data) / 1e6:.1f} MB')
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SidecarStore(directory)
+
+        start = time.perf_counter()
+        cold = load_dataset(data, DatasetCache(), store=store)
+        cold.frame(cold.headers[:2])
+        cold_s = time.perf_counter() - start
+
+        # A fresh in-memory cache stands in for a new server process.
+        start = time.perf_counter()
+        warm = load_dataset(data, DatasetCache(), store=store)
+        frame = warm.frame(warm.headers[:2])
+        warm_s = time.perf_counter() - start
+
+        assert frame.equals(cold.frame(cold.headers[:2]))
+        sidecar_mb = os.path.getsize(store.path(cold.key)) / 1e6
+
+    print(f'cold xlsx parse + sidecar write: {cold_s:8.3f} s')
+    print(f'warm sidecar load (2 columns):   {warm_s:8.3f} s  ({sidecar_mb:.1f} MB on disk)')
+    print(f'speedup: {cold_s / warm_s:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
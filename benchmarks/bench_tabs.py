@@ -0,0 +1,97 @@
+'''Drive every dashboard tab with generated workbooks of increasing size.
+
+    python benchmarks/bench_tabs.py --sizes 1000 10000 100000 --format xlsx
+
+For each size, uploads a fresh sweep-shaped file into the app (headless,
+through Streamlit's AppTest) and selects columns in every tab. Each tab is
+then exercised twice: a title edit, which redraws it, and Edit Axis, which
+adds the zoomed view. Prints the time each tab took and the stage breakdown
+collected by the dashboard's telemetry.
+'''
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from telemetry import telemetry  # noqa: E402
+
+TABS = ['Line plot', 'Same X-axis', 'Same Y-axis', 'Two Y-axis', 'Scatter Plot']
+# Edit Axis toggle and title box of each tab, in tab order.
+TOGGLES = ['tab1', 'tab2', 'tab3', 'tab4', 'tab5']
+
+
+def make_file(rows, fmt, seed):
+    rng = np.random.default_rng(seed)
+    freq = np.linspace(10e6, 20e9, rows)
+    df = pd.DataFrame({
+        'Frequency (Hz)': freq,
+        'S21 dB': -3 - 10 * np.log10(1 + freq / 1e9) + rng.normal(0, 0.2, rows),
+        'S11 dB': -15 + 5 * np.sin(freq / 1e9) + rng.normal(0, 0.5, rows),
+        'S21 deg': rng.uniform(-180, 180, rows),
+    })
+    if fmt == 'csv':
+        return f'sweep{rows}.csv', df.to_csv(index=False).encode(), 'text/csv'
+    buf = BytesIO()
+    df.to_excel(buf, index=False)
+    return f'sweep{rows}.xlsx', buf.getvalue(), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def tab_times(at):
+    return dict(at.session_state['tab_timings'])
+
+
+def run_size(rows, fmt, seed):
+    at = AppTest.from_file(os.path.join(ROOT, 'Dashboard.py'), default_timeout=600)
+    at.run()
+    upload = make_file(rows, fmt, seed)
+    start = time.perf_counter()
+    uploader = next(w for w in at.file_uploader if w.label == 'Choose a file')
+    uploader.set_value(upload).run()
+    first = time.perf_counter() - start
+    headers = at.selectbox(key='x_column').options
+    at.multiselect(key='y_columns').set_value(headers[1:3])
+    at.multiselect(key='x_columns').set_value(headers[:1])
+    at.run()
+    titles = [w for w in at.text_input if w.label == 'Enter the title for the graph']
+    results = {tab: {'select': t} for tab, t in tab_times(at).items()}
+    for tab, title, toggle in zip(TABS, titles, TOGGLES):
+        title.set_value(f'{tab} {rows}').run()
+        results[tab]['redraw'] = tab_times(at)[tab]
+        at.toggle(key=toggle).set_value(True).run()
+        results[tab]['zoom'] = tab_times(at)[tab]
+        # One zoomed tab at a time; the Same X/Y tabs share widget keys.
+        at.toggle(key=toggle).set_value(False).run()
+    errors = [e.value for e in at.exception]
+    return first, results, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--format', choices=['xlsx', 'csv'], default='xlsx')
+    args = parser.parse_args()
+
+    for seed, rows in enumerate(args.sizes):
+        first, results, errors = run_size(rows, args.format, seed)
+        print(f'\n{rows:,} rows ({args.format}): upload and first run {first:.2f} s')
+        for error in errors:
+            print(f'  error: {error}')
+        print(f"  {'tab':<14}{'select':>10}{'redraw':>10}{'zoom':>10}  (ms)")
+        for tab in TABS:
+            times = results.get(tab, {})
+            print(f'  {tab:<14}' + ''.join(f"{times.get(k, float('nan')) * 1000:>10.0f}" for k in ('select', 'redraw', 'zoom')))
+
+    print('\nstage totals across all runs:')
+    for stage, s in sorted(telemetry.snapshot()['stages'].items()):
+        print(f"  {stage:<22}{s['count']:>6} calls {s['sum']:>9.2f} s  p95 {s['p95'] * 1000:>8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
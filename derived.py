@@ -0,0 +1,166 @@
+'''Derived columns: vectorized NumPy expressions over a dataset's columns.
+
+A derived column is named by its own expression, e.g. `20 * log10(abs(S21))`,
+so plot specs, cache keys and saved batch specs refer to it like any other
+column. Column names that are not Python identifiers are quoted in
+backticks: `-d(unwrap(rad(`S21 deg`))) / d(2 * pi * `Frequency (Hz)`)`.
+'''
+import ast
+import keyword
+import re
+from functools import lru_cache
+
+import numpy as np
+
+
+def _db(x):
+    return 20 * np.log10(np.abs(x))
+
+
+def _vswr(gamma):
+    magnitude = np.abs(gamma)
+    return (1 + magnitude) / (1 - magnitude)
+
+
+def _polar(magnitude, degrees):
+    return magnitude * np.exp(1j * np.deg2rad(degrees))
+
+
+# name -> (function, number of arguments). The count is enforced: a second
+# argument to a NumPy ufunc is its `out` array, which would be written over.
+FUNCTIONS = {
+    'abs': (np.abs, 1),
+    'real': (np.real, 1),
+    'imag': (np.imag, 1),
+    'conj': (np.conj, 1),
+    'angle': (np.angle, 1),
+    'unwrap': (np.unwrap, 1),
+    'deg': (np.rad2deg, 1),
+    'rad': (np.deg2rad, 1),
+    'sqrt': (np.sqrt, 1),
+    'exp': (np.exp, 1),
+    'log': (np.log, 1),
+    'log10': (np.log10, 1),
+    'sin': (np.sin, 1),
+    'cos': (np.cos, 1),
+    'tan': (np.tan, 1),
+    'db': (_db, 1),
+    'db10': (lambda x: 10 * np.log10(np.abs(x)), 1),
+    'undb': (lambda x: 10 ** (x / 20), 1),
+    'vswr': (_vswr, 1),
+    'polar': (_polar, 2),
+    # d(y) / d(x) is the derivative dy/dx, with central differences inside
+    # and one-sided ones at the ends.
+    'd': (np.gradient, 1),
+}
+CONSTANTS = {'pi': np.pi, 'e': np.e, 'j': 1j}
+
+_BINARY = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+    ast.Pow: np.power,
+}
+_UNARY = {ast.USub: np.negative, ast.UAdd: np.positive}
+_QUOTED = re.compile(r'`([^`]+)`')
+
+
+class Expression:
+    def __init__(self, text, tree, names):
+        self.text = text
+        self._tree = tree
+        # Identifiers the expression reads: column names, or constants.
+        self.names = names
+
+    def evaluate(self, columns, rows):
+        '''Evaluate over `columns` (name -> array) and return a float array of `rows` values.
+
+        Raises ValueError if it cannot be evaluated or the result is complex.
+        '''
+        values = {**CONSTANTS, **columns}
+        try:
+            with np.errstate(all='ignore'):
+                result = np.asarray(_evaluate(self._tree.body, values))
+        except TypeError as exc:
+            # e.g. a text column.
+            raise ValueError(f'cannot evaluate {self.text}: {exc}') from None
+        if np.iscomplexobj(result):
+            raise ValueError(f'{self.text} gives complex values; take abs(), real(), imag() or angle() of it')
+        if result.ndim == 0:
+            result = np.full(rows, result)
+        return result.astype(np.float64, copy=False)
+
+
+@lru_cache(maxsize=256)
+def compile_expression(text):
+    '''Parse and check an expression; raises ValueError if it is not one.
+
+    Equivalent spellings (spacing, redundant quotes or parentheses) compile
+    to the same canonical text.
+    '''
+    quoted = {}
+
+    def placeholder(match):
+        token = f'__column{len(quoted)}__'
+        quoted[token] = match.group(1)
+        return token
+
+    try:
+        tree = ast.parse(_QUOTED.sub(placeholder, text.strip()), mode='eval')
+    except SyntaxError:
+        raise ValueError(f'cannot parse {text!r}') from None
+    callees = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                raise ValueError(f'unknown function in {ast.unparse(node)!r}; available: {", ".join(FUNCTIONS)}')
+            arguments = FUNCTIONS[node.func.id][1]
+            if len(node.args) != arguments or any(isinstance(arg, ast.Starred) for arg in node.args):
+                raise ValueError(f'{node.func.id}() takes {arguments} argument{"s" if arguments > 1 else ""}, in {ast.unparse(node)!r}')
+        elif isinstance(node, ast.Name):
+            if id(node) not in callees:
+                names.add(node.id)
+        elif isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float, complex)):
+                raise ValueError(f'unsupported value {ast.unparse(node)!r}')
+        elif isinstance(node, ast.BinOp):
+            if isinstance(node.op, ast.BitXor):
+                raise ValueError(f'use ** for powers in {text!r}')
+            if type(node.op) not in _BINARY:
+                raise ValueError(f'unsupported operator in {ast.unparse(node)!r}')
+        elif isinstance(node, ast.UnaryOp):
+            if type(node.op) not in _UNARY:
+                raise ValueError(f'unsupported operator in {ast.unparse(node)!r}')
+        elif not isinstance(node, (ast.Expression, ast.Load, ast.operator, ast.unaryop)):
+            raise ValueError(f'unsupported syntax in {text!r}')
+    canonical = ast.unparse(tree)
+    for token, name in quoted.items():
+        canonical = canonical.replace(token, name if _bare(name) else f'`{name}`')
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in quoted:
+            node.id = quoted[node.id]
+        elif isinstance(node, ast.Constant) and isinstance(node.value, int):
+            # As NumPy int64, 10 ** -9 would be an error and 2 ** 70 would wrap.
+            try:
+                node.value = float(node.value)
+            except OverflowError:
+                raise ValueError(f'number too large in {text!r}') from None
+    return Expression(canonical, tree, frozenset(quoted.get(n, n) for n in names))
+
+
+def _bare(name):
+    return name.isidentifier() and not keyword.iskeyword(name) and name not in FUNCTIONS
+
+
+def _evaluate(node, values):
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        return values[node.id]
+    if isinstance(node, ast.BinOp):
+        return _BINARY[type(node.op)](_evaluate(node.left, values), _evaluate(node.right, values))
+    if isinstance(node, ast.UnaryOp):
+        return _UNARY[type(node.op)](_evaluate(node.operand, values))
+    return FUNCTIONS[node.func.id][0](*(_evaluate(arg, values) for arg in node.args))
@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from plotspec import apply_limits, draw_plot, spec_frame
+from plotting import figure_png, managed_figure
+from telemetry import timed
+
+EXPORT_CACHE_MAX_BYTES = int(float(os.environ.get('RFENG_EXPORT_CACHE_MB', 256)) * 1024 * 1024)
+RENDER_CACHE_MAX_BYTES = int(float(os.environ.get('RFENG_RENDER_CACHE_MB', 256)) * 1024 * 1024)
+
+# Download choice -> (savefig format, file extension, MIME type)
+FORMATS = {
+    'PNG': ('png', 'png', 'image/png'),
+    'SVG': ('svg', 'svg', 'image/svg+xml'),
+    'PDF': ('pdf', 'pdf', 'application/pdf'),
+}
+
+
+class ImageCache:
+    '''LRU cache of rendered image bytes, bounded by total size.'''
+
+    def __init__(self, max_bytes=EXPORT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= len(old)
+            self._entries[key] = data
+            self.nbytes += len(data)
+            while len(self._entries) > 1 and self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+
+def render_image(spec, frame, fmt='PNG', dpi=100, note=None):
+    '''Draw a spec on a fresh figure and return the encoded file.
+
+    `note` is printed small in the bottom-left corner, e.g. the file plotted.
+    '''
+    savefig_format = FORMATS[fmt][0]
+    with managed_figure() as fig:
+        with timed('plot.draw'):
+            draw_plot(fig, spec, frame)
+            if note is not None:
+                fig.text(0.01, 0.01, note, fontsize='x-small', color='gray')
+        buf = BytesIO()
+        with timed('export.encode'):
+            fig.savefig(buf, format=savefig_format, dpi=dpi)
+    return buf.getvalue()
+
+
+def export_bytes(dataset, spec, fmt='PNG', dpi=100, cache=None, sheets=None):
+    '''Return the download file for a spec, rendering it only on a cache miss.
+
+    Meant to be handed to st.download_button as a deferred callable, so
+    nothing is rendered until the user actually clicks.
+    '''
+    # Vector formats do not depend on the dpi.
+    key = (dataset.key, spec.canonical(), fmt, dpi if fmt == 'PNG' else None)
+    data = cache.get(key) if cache is not None else None
+    if data is None:
+        data = render_image(spec, spec_frame(dataset, spec, sheets), fmt, dpi)
+        if cache is not None:
+            cache.put(key, data)
+    return data
+
+
+def render_pngs(dataset, specs, cache=None, sheets=None):
+    '''On-screen PNGs for variants of one plot that differ only in their limits.
+
+    Cached images are returned as they are; the rest are drawn on a single
+    figure, which is re-windowed for each zoomed variant instead of redrawn.
+    '''
+    keys = [(dataset.key, spec.canonical(), 'display') for spec in specs]
+    pngs = [cache.get(key) if cache is not None else None for key in keys]
+    stale = [i for i, png in enumerate(pngs) if png is None]
+    if stale:
+        with managed_figure() as fig:
+            with timed('plot.draw'):
+                draw_plot(fig, specs[0], spec_frame(dataset, specs[0], sheets))
+            for i in stale:
+                with timed('plot.rasterize'):
+                    apply_limits(fig, specs[i])
+                    pngs[i] = figure_png(fig)
+                if cache is not None:
+                    cache.put(keys[i], pngs[i])
+    return pngs
@@ -0,0 +1,279 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from derived import CONSTANTS, compile_expression
+from readers import read_upload, sheet_names
+from telemetry import timed
+
+# Cache limits can be tuned per deployment without touching the code.
+CACHE_MAX_ENTRIES = int(os.environ.get('RFENG_CACHE_ENTRIES', 8))
+CACHE_MAX_BYTES = int(float(os.environ.get('RFENG_CACHE_MB', 1024)) * 1024 * 1024)
+
+
+def file_key(data):
+    # Content hash of the uploaded bytes, so the same workbook uploaded twice
+    # (or by two engineers) maps to the same cache entry.
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def path_key(path, chunk_bytes=1 << 20):
+    '''file_key() of a file on disk, hashed without reading it all into memory.'''
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sheet_key(key, sheets, sheet):
+    '''Cache key of one sheet of the workbook with file key `key` and sheet names `sheets`.'''
+    index = sheets.index(sheet)
+    # The first sheet keeps the plain file key, matching uploads that
+    # were cached before sheets could be picked.
+    return f'{key}-{index}' if index else key
+
+
+class Dataset:
+    '''A parsed upload plus the derived objects every tab needs.
+
+    A Dataset is backed either by a DataFrame already in memory or by a
+    sidecar table on disk, in which case columns are read only when a tab
+    asks for them. Derived columns (see derived.py) are evaluated the first
+    time they are asked for and kept with the dataset.
+    '''
+
+    def __init__(self, key, df=None, source=None):
+        self.key = key
+        self._df = df
+        self._source = source
+        self._columns = {}
+        self._derived = {}
+        self.columns = df.columns.tolist() if df is not None else list(source.headers)
+        self._stored = set(self.columns)
+        # Complex columns (e.g. Touchstone S-parameters) stay in the dataset,
+        # but only real columns are offered for plotting.
+        self.headers = self.columns if df is None else [
+            c for c in self.columns if not pd.api.types.is_complex_dtype(df[c])
+        ]
+        self._preview = None
+        self._summary = None
+
+    @property
+    def nbytes(self):
+        derived = sum(values.nbytes for values in self._derived.values())
+        if self._df is not None:
+            return int(self._df.memory_usage(deep=True).sum()) + derived
+        return int(sum(s.memory_usage(deep=True) for s in self._columns.values())) + derived
+
+    def frame(self, columns=None):
+        '''Return a DataFrame holding only the requested columns.
+
+        Names that are not columns of the dataset are evaluated as derived
+        column expressions.
+        '''
+        if columns is None:
+            columns = self.columns
+        columns = list(dict.fromkeys(c for c in columns if c is not None))
+        stored = [c for c in columns if c in self._stored]
+        if len(stored) == len(columns):
+            return self._stored_frame(columns)
+        data = dict(self._stored_frame(stored).items())
+        for c in columns:
+            if c not in data:
+                data[c] = self._derived_column(c)
+        return pd.DataFrame(data, columns=columns)
+
+    def _stored_frame(self, columns):
+        if self._df is not None:
+            return self._df[columns]
+        missing = [c for c in columns if c not in self._columns]
+        if missing:
+            with timed('ingest.column_read'):
+                loaded = self._source.read(missing)
+            for c in missing:
+                self._columns[c] = loaded[c]
+        return pd.DataFrame({c: self._columns[c] for c in columns}, columns=columns)
+
+    def _derived_column(self, text):
+        values = self._derived.get(text)
+        if values is None:
+            expression = compile_expression(text)
+            missing = self.missing([text])
+            if missing:
+                raise KeyError(f'{text} refers to missing column {missing[0]!r}')
+            with timed('ingest.derive'):
+                inputs = self._stored_frame([n for n in expression.names if n in self._stored])
+                values = expression.evaluate({n: inputs[n].to_numpy() for n in inputs}, self.num_rows)
+            self._derived[text] = values
+        return values
+
+    def missing(self, columns):
+        '''Columns among `columns` this dataset cannot provide.
+
+        For a derived column these are the columns its expression refers to
+        that the dataset lacks, or the expression itself if it does not parse.
+        '''
+        missing = []
+        for c in columns:
+            if c in self._stored:
+                continue
+            try:
+                names = compile_expression(c).names
+            except ValueError:
+                missing.append(c)
+                continue
+            missing += [n for n in names if n not in self._stored and n not in CONSTANTS]
+        return missing
+
+    def check_expression(self, text):
+        '''Validate a derived column on the first rows and return its canonical name.
+
+        Raises ValueError (or KeyError for an unknown column) with a message
+        for the user. Nothing is evaluated over the full dataset.
+        '''
+        expression = compile_expression(text)
+        missing = self.missing([expression.text])
+        if missing:
+            raise KeyError(f'no column {missing[0]!r}')
+        names = [n for n in expression.names if n in self._stored]
+        sample = self.rows(0, 16, names)
+        expression.evaluate({n: sample[n].to_numpy() for n in names}, len(sample))
+        return expression.text
+
+    @property
+    def df(self):
+        return self.frame()
+
+    @property
+    def num_rows(self):
+        return len(self._df) if self._df is not None else self._source.num_rows
+
+    def rows(self, start, stop, columns=None):
+        '''Rows [start, stop) of the plottable (or given) columns, without loading the rest.'''
+        if columns is None:
+            columns = self.headers
+        if self._df is not None:
+            return self._df[columns].iloc[start:stop]
+        if all(c in self._columns for c in columns):
+            return self.frame(columns).iloc[start:stop]
+        return self._source.read_rows(start, stop, columns)
+
+    @property
+    def summary(self):
+        '''Per-column dtype, min, max and NaN count, computed once per dataset.'''
+        if self._summary is None:
+            if self._source is not None and self._source.summary is not None:
+                self._summary = self._source.summary
+            else:
+                self._summary = summarize(self.frame(self.headers))
+        return self._summary
+
+    @property
+    def preview(self):
+        # Built once per dataset instead of once per rerun.
+        if self._preview is None:
+            self._preview = self.frame(self.headers).set_index(self.headers[0])
+        return self._preview
+
+
+def summarize(df):
+    records = []
+    for column in df.columns:
+        values = df[column].to_numpy()
+        if np.issubdtype(values.dtype, np.number) and not np.iscomplexobj(values):
+            values = values.astype(np.float64, copy=False)
+            missing = np.isnan(values)
+            present = values[~missing]
+            low, high = (present.min(), present.max()) if present.size else (np.nan, np.nan)
+            records.append((str(values.dtype), low, high, int(missing.sum())))
+        else:
+            records.append((str(df[column].dtype), np.nan, np.nan, int(df[column].isna().sum())))
+    return pd.DataFrame(records, index=df.columns, columns=['dtype', 'min', 'max', 'NaN count'])
+
+
+class DatasetCache:
+    '''LRU cache of Datasets bounded by entry count and total bytes.'''
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nbytes(self):
+        return sum(ds.nbytes for ds in self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            ds = self._entries.get(key)
+            if ds is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return ds
+
+    def put(self, ds):
+        with self._lock:
+            self._entries[ds.key] = ds
+            self._entries.move_to_end(ds.key)
+            self._evict()
+
+    def _evict(self):
+        # Always keep the most recent entry, even if it alone exceeds the budget.
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.nbytes > self.max_bytes
+        ):
+            self._entries.popitem(last=False)
+
+
+def load_dataset(data, cache, key=None, store=None, name='upload.xlsx', sheet=None):
+    '''Return the Dataset for the given file bytes, parsing only on a cache miss.
+
+    `name` is the uploaded file name; its extension picks the reader. For
+    workbooks, `sheet` picks a sheet by name and each sheet is parsed and
+    cached on its own, the first time it is asked for.
+
+    With a SidecarStore, the first parse also writes a columnar copy of the
+    workbook, and later sessions open that copy instead of the xlsx.
+    '''
+    if key is None:
+        key = file_key(data)
+    if sheet is not None:
+        key = sheet_key(key, sheet_names(data), sheet)
+    ds = cached_dataset(key, cache, store)
+    if ds is not None:
+        return ds
+    with timed('ingest.parse'):
+        df = read_upload(data, name, sheet)
+    ds = Dataset(key, df)
+    if store is not None:
+        with timed('ingest.sidecar_write'):
+            store.write(key, df, ds.summary)
+    cache.put(ds)
+    return ds
+
+
+def cached_dataset(key, cache, store=None):
+    '''The Dataset for `key` from the cache or a sidecar, or None if it has to be parsed.'''
+    ds = cache.get(key)
+    if ds is not None:
+        return ds
+    with timed('ingest.sidecar_open'):
+        source = store.open(key) if store is not None else None
+    if source is None:
+        return None
+    ds = Dataset(key, source=source)
+    cache.put(ds)
+    return ds
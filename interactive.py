@@ -0,0 +1,141 @@
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+
+from plotspec import spec_frame
+from plotting import SCATTER_MAX_POINTS, _decimatable, density_grid, minmax_decimate
+from telemetry import timed
+
+# Buckets per line sent to the browser. Each keeps at most four samples, so
+# a trace stays under ~16k points while leaving detail to zoom into.
+WEBGL_BUCKETS = int(os.environ.get('RFENG_WEBGL_BUCKETS', 4000))
+# Density grid for scatter plots above SCATTER_MAX_POINTS.
+DENSITY_BINS = (480, 320)
+
+# matplotlib legend location -> (x, y, xanchor, yanchor) in plot coordinates
+LEGEND_POSITIONS = {
+    'upper right': (0.99, 0.99, 'right', 'top'),
+    'upper left': (0.01, 0.99, 'left', 'top'),
+    'upper center': (0.5, 0.99, 'center', 'top'),
+    'lower right': (0.99, 0.01, 'right', 'bottom'),
+    'lower left': (0.01, 0.01, 'left', 'bottom'),
+    'lower center': (0.5, 0.01, 'center', 'bottom'),
+}
+
+
+# float32 rounding must stay this many times below the average spacing of
+# the samples sent, so zooming in to single samples still shows true values.
+FLOAT32_MARGIN = 100
+
+
+def _compact(values):
+    # Plotly sends NumPy arrays as base64 typed arrays; float32 halves them
+    # where its rounding is negligible next to the spacing of the samples.
+    # A narrow sweep at a high frequency (5.99-6.01 GHz) stays float64.
+    if values.dtype != np.float64:
+        return values
+    finite = values[np.isfinite(values)]
+    if not finite.size:
+        return values
+    rounding = np.finfo(np.float32).eps * np.abs(finite).max()
+    if FLOAT32_MARGIN * rounding <= np.ptp(finite) / finite.size:
+        return values.astype(np.float32)
+    return values
+
+
+def _range(lim, scale):
+    # Plotly gives log axis ranges as powers of ten.
+    if lim is None:
+        return None
+    lo, hi = lim
+    if scale == 'log':
+        if lo <= 0 or hi <= 0:
+            return None
+        return [np.log10(lo), np.log10(hi)]
+    return [lo, hi]
+
+
+def _legend(loc, default):
+    x, y, xanchor, yanchor = LEGEND_POSITIONS.get(loc, default)
+    return dict(x=x, y=y, xanchor=xanchor, yanchor=yanchor, font=dict(size=10))
+
+
+def _line(spec, trace, x, y, buckets, legend):
+    if _decimatable(x, y):
+        # Over just the Edit Axis window, in buckets along the axis as drawn,
+        # like the image renderer's set_xwindow().
+        x, y = minmax_decimate(x, y, buckets, xlim=spec.xlim, xscale=spec.xscale)
+        x, y = _compact(x), _compact(y)
+    return go.Scattergl(
+        x=x, y=y, mode='lines', name=trace.label,
+        showlegend=trace.label is not None and legend is not None,
+        line=dict(dash='dash') if trace.secondary else None,
+        yaxis='y2' if trace.secondary else 'y',
+        legend='legend2' if trace.secondary else 'legend',
+    )
+
+
+def _scatter(spec, x, y, max_points):
+    if not _decimatable(x, y):
+        return go.Scattergl(x=x, y=y, mode='markers', marker=dict(size=5), showlegend=False)
+    if len(x) <= max_points:
+        return go.Scattergl(x=_compact(x), y=_compact(y), mode='markers', marker=dict(size=5), showlegend=False)
+    xedges, yedges, counts = density_grid(x, y, *DENSITY_BINS, spec.xscale, spec.yscale, spec.xlim, spec.ylim)
+    # Empty bins stay transparent so the plot reads like a scatter.
+    with np.errstate(divide='ignore'):
+        z = np.where(counts.T > 0, np.log10(counts.T), np.nan)
+    return go.Heatmap(
+        x=xedges, y=yedges, z=z.astype(np.float32), colorscale='Viridis',
+        colorbar=dict(title='log10 points per bin'), hoverongaps=False,
+    )
+
+
+def plotly_figure(spec, frame, buckets=WEBGL_BUCKETS, max_points=SCATTER_MAX_POINTS):
+    '''Draw a spec as a Plotly figure with WebGL traces, using the data from spec_frame().
+
+    Lines are min/max decimated to `buckets` before they are sent, and large
+    scatter plots become a density heatmap, so the browser receives a
+    bounded amount of data whatever the row count. Pan and zoom then run
+    entirely in the browser.
+    '''
+    fig = go.Figure()
+    secondary = any(t.secondary for t in spec.traces)
+    for t in spec.traces:
+        x = np.asarray(frame[t.sheet, t.x])
+        y = np.asarray(frame[t.sheet, t.y])
+        if spec.kind == 'scatter':
+            fig.add_trace(_scatter(spec, x, y, max_points))
+        else:
+            fig.add_trace(_line(spec, t, x, y, buckets, spec.legend2 if t.secondary else spec.legend))
+    fig.update_layout(
+        title=dict(text=spec.title, x=0.5, xanchor='center'),
+        xaxis=dict(title=spec.xlabel, type=spec.xscale, range=_range(spec.xlim, spec.xscale), showgrid=True),
+        yaxis=dict(title=spec.ylabel, type=spec.yscale, range=_range(spec.ylim, spec.yscale), showgrid=True),
+        legend=_legend(spec.legend, LEGEND_POSITIONS['upper right']),
+        margin=dict(l=60, r=60, t=60, b=50),
+        # Keeps the browser's zoom across reruns until the data or limits change.
+        uirevision=repr((spec.kind, spec.traces, spec.xscale, spec.yscale, spec.xlim, spec.ylim, spec.y2lim)),
+    )
+    if secondary:
+        fig.update_layout(
+            yaxis2=dict(
+                title=dict(text=spec.y2label, font=dict(color='blue')),
+                range=_range(spec.y2lim, 'linear'), overlaying='y', side='right',
+                tickfont=dict(color='blue'), showgrid=True, griddash='dash',
+            ),
+            legend2=_legend(spec.legend2, LEGEND_POSITIONS['lower right']),
+        )
+    return fig
+
+
+def chart_json(dataset, spec, cache=None, sheets=None):
+    '''Plotly JSON for a spec, decimating the data only on a cache miss.'''
+    key = (dataset.key, spec.canonical(), 'webgl')
+    data = cache.get(key) if cache is not None else None
+    if data is None:
+        with timed('plot.webgl'):
+            data = plotly_figure(spec, spec_frame(dataset, spec, sheets)).to_json().encode()
+        if cache is not None:
+            cache.put(key, data)
+    return data
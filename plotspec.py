@@ -0,0 +1,182 @@
+import json
+from dataclasses import asdict, dataclass, field, fields, replace
+
+from plotting import plot_line, plot_scatter, set_scatter_window, set_xwindow
+
+
+@dataclass(frozen=True)
+class Trace:
+    x: str
+    y: str
+    label: str = None
+    secondary: bool = False
+    # Another sheet of the same workbook; None for the dataset's own sheet.
+    sheet: str = None
+
+
+@dataclass(frozen=True)
+class PlotSpec:
+    '''Everything a tab collects to draw one plot.
+
+    Specs are hashable, so together with the dataset key they identify a
+    rendered image.
+    '''
+
+    kind: str
+    traces: tuple
+    title: str = ''
+    xlabel: str = ''
+    ylabel: str = ''
+    y2label: str = ''
+    xscale: str = 'linear'
+    yscale: str = 'linear'
+    legend: str = None
+    legend2: str = None
+    xlim: tuple = None
+    ylim: tuple = None
+    y2lim: tuple = None
+    columns: tuple = field(init=False, compare=False, repr=False)
+
+    def __post_init__(self):
+        # Columns needed from the dataset's own sheet.
+        columns = dict.fromkeys(c for t in self.traces if t.sheet is None for c in (t.x, t.y))
+        object.__setattr__(self, 'columns', tuple(columns))
+
+    @property
+    def sheet_columns(self):
+        '''Columns needed from each other sheet, by sheet name.'''
+        columns = {}
+        for t in self.traces:
+            if t.sheet is not None:
+                columns.setdefault(t.sheet, {}).update(dict.fromkeys((t.x, t.y)))
+        return {sheet: tuple(names) for sheet, names in columns.items()}
+
+    def canonical(self):
+        '''Equivalent spec with settings that cannot affect the image normalized away.
+
+        Used as the cache key, so e.g. a secondary-axis label typed while no
+        line is on the secondary axis, or limits entered as int vs. float, do
+        not produce a separate cache entry.
+        '''
+        secondary = any(t.secondary for t in self.traces)
+        # A trace label only shows up through the legend of its own axis.
+        legends = {False: self.legend, True: self.legend2}
+        traces = tuple(
+            t if self.kind != 'scatter' and legends[t.secondary] else replace(t, label=None)
+            for t in self.traces
+        )
+        return replace(
+            self,
+            traces=traces,
+            legend=self.legend if self.kind != 'scatter' else None,
+            y2label=self.y2label if secondary else '',
+            legend2=self.legend2 if secondary else None,
+            xlim=_limits(self.xlim),
+            ylim=_limits(self.ylim),
+            y2lim=_limits(self.y2lim) if secondary else None,
+        )
+
+    def to_dict(self):
+        '''JSON-ready form of the spec, as saved for batch reports.'''
+        data = {f.name: getattr(self, f.name) for f in fields(self) if f.init}
+        data['traces'] = [asdict(t) for t in self.traces]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data['traces'] = tuple(Trace(**t) for t in data['traces'])
+        for name in ('xlim', 'ylim', 'y2lim'):
+            if data.get(name) is not None:
+                data[name] = tuple(data[name])
+        return cls(**data)
+
+
+def dump_specs(specs):
+    '''Serialize a list of specs to the JSON read by load_specs().'''
+    return json.dumps([spec.to_dict() for spec in specs], indent=2)
+
+
+def load_specs(text):
+    return [PlotSpec.from_dict(data) for data in json.loads(text)]
+
+
+def with_sheet(spec, sheet):
+    '''The same spec with its own-sheet traces pinned to `sheet`.
+
+    A saved spec then draws the sheet it was made from, whichever sheet a
+    workbook opens on.
+    '''
+    if sheet is None:
+        return spec
+    return replace(spec, traces=tuple(t if t.sheet is not None else replace(t, sheet=sheet) for t in spec.traces))
+
+
+def spec_frame(dataset, spec, sheets=None):
+    '''Collect the data a spec draws, keyed by (sheet, column).
+
+    Only the columns the traces use are read, from the dataset itself and
+    from the other sheets' Datasets in `sheets`.
+    '''
+    frame = {}
+    for column, values in dataset.frame(spec.columns).items():
+        frame[None, column] = values
+    for sheet, columns in spec.sheet_columns.items():
+        for column, values in sheets[sheet].frame(columns).items():
+            frame[sheet, column] = values
+    return frame
+
+
+def draw_plot(fig, spec, frame):
+    '''Draw a spec onto an empty figure, using the data from spec_frame().'''
+    ax = fig.subplots()
+    # Lines are decimated in the axes' own scales, so these come first.
+    ax.set_xscale(spec.xscale)
+    ax.set_yscale(spec.yscale)
+    primary = [t for t in spec.traces if not t.secondary]
+    secondary = [t for t in spec.traces if t.secondary]
+    if spec.kind == 'scatter':
+        for t in primary:
+            plot_scatter(ax, frame[t.sheet, t.x], frame[t.sheet, t.y], spec.xscale, spec.yscale)
+    else:
+        for t in primary:
+            plot_line(ax, frame[t.sheet, t.x], frame[t.sheet, t.y], **_label(t))
+    ax.grid(True)
+    ax.set_xlabel(spec.xlabel)
+    ax.set_ylabel(spec.ylabel)
+    ax.set_title(spec.title)
+    if secondary:
+        ax2 = ax.twinx()
+        for t in secondary:
+            plot_line(ax2, frame[t.sheet, t.x], frame[t.sheet, t.y], linestyle='--', **_label(t))
+        ax2.set_ylabel(spec.y2label, color='blue')
+        ax2.grid(linewidth=0.5)
+        ax2.tick_params(axis='y', color='blue', labelcolor='blue')
+        if spec.legend2:
+            ax2.legend(loc=spec.legend2, fontsize='small')
+    if spec.legend:
+        ax.legend(loc=spec.legend, fontsize='small')
+    apply_limits(fig, spec)
+
+
+def apply_limits(fig, spec):
+    '''Apply the spec's axis limits to a figure drawn by draw_plot().'''
+    ax = fig.axes[0]
+    if spec.kind == 'scatter':
+        if spec.xlim is not None or spec.ylim is not None:
+            set_scatter_window(ax, spec.xlim, spec.ylim)
+        return
+    if spec.xlim is not None:
+        set_xwindow(fig, spec.xlim)
+    if spec.ylim is not None:
+        ax.set_ylim(list(spec.ylim))
+    if spec.y2lim is not None and len(fig.axes) > 1:
+        fig.axes[1].set_ylim(list(spec.y2lim))
+
+
+def _limits(lim):
+    return None if lim is None else tuple(float(v) for v in lim)
+
+
+def _label(trace):
+    return {'label': trace.label} if trace.label is not None else {}
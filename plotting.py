@@ -0,0 +1,287 @@
+import os
+import weakref
+from contextlib import contextmanager
+from io import BytesIO
+
+import numpy as np
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+
+# Figures are created directly rather than through pyplot, so they never land
+# in pyplot's global registry, which holds every figure until plt.close().
+_live = weakref.WeakSet()
+_counts = {'created': 0, 'closed': 0}
+# st.pyplot rasterizes at 200 dpi regardless of the figure's own dpi.
+RENDER_DPI = 200
+# Above this many points the scatter plot is drawn as a density grid.
+SCATTER_MAX_POINTS = int(os.environ.get('RFENG_SCATTER_MAX_POINTS', 100_000))
+# Screen pixels per density bin along each axis.
+DENSITY_BIN_PX = 3
+# Scatter plots with more points than this are embedded in PDF and SVG
+# files as an image; as vector markers they take seconds to write.
+RASTERIZE_POINTS = int(os.environ.get('RFENG_RASTERIZE_POINTS', 10_000))
+# Full-resolution data behind each decimated line or density grid, for
+# re-rendering on zoom.
+_sources = weakref.WeakKeyDictionary()
+
+
+def new_figure(**kwargs):
+    fig = Figure(**kwargs)
+    _live.add(fig)
+    _counts['created'] += 1
+    return fig
+
+
+def close_figure(fig):
+    # Drop the artists (and the data arrays they reference) right away
+    # instead of waiting for the garbage collector to find the figure.
+    fig.clear()
+    _live.discard(fig)
+    _counts['closed'] += 1
+
+
+@contextmanager
+def managed_figure(**kwargs):
+    fig = new_figure(**kwargs)
+    try:
+        yield fig
+    finally:
+        close_figure(fig)
+
+
+def figure_nbytes(fig):
+    '''Approximate bytes held by the data arrays of a figure's artists.'''
+    total = 0
+    for ax in fig.axes:
+        for line in ax.lines:
+            total += line.get_xydata().nbytes
+        for collection in ax.collections:
+            total += collection.get_offsets().nbytes
+            if collection.get_array() is not None:
+                total += collection.get_array().nbytes
+    return total
+
+
+def source_nbytes():
+    '''Bytes of the full-resolution arrays kept for re-rendering on zoom.'''
+    # Traces plotted against the same column share its array.
+    arrays = {id(a): a for source in list(_sources.values()) for a in source[:2]}
+    return sum(a.nbytes for a in arrays.values())
+
+
+def figure_stats():
+    live = list(_live)
+    return {
+        'live': len(live),
+        'live_bytes': sum(figure_nbytes(fig) for fig in live),
+        'sources': len(_sources),
+        'source_bytes': source_nbytes(),
+        'created': _counts['created'],
+        'closed': _counts['closed'],
+    }
+
+
+def _run_extremes(values, starts, run):
+    # Index of the min and max of `values` within each run of samples.
+    # NaN gaps must neither win nor break the reductions.
+    low = np.where(np.isnan(values), np.inf, values)
+    high = np.where(np.isnan(values), -np.inf, values)
+    extremes = []
+    for v, reduce in ((low, np.minimum), (high, np.maximum)):
+        hit = np.flatnonzero(v == reduce.reduceat(v, starts)[run])
+        # First hit in each run; every run has at least one.
+        extremes.append(hit[np.unique(run[hit], return_index=True)[1]])
+    return extremes
+
+
+def minmax_decimate(x, y, buckets, xlim=None, xscale='linear'):
+    '''Reduce a trace to the extreme samples of each of `buckets` X buckets.
+
+    The buckets are equally wide along the X axis as drawn (in log10(x) for
+    a log axis), so with one bucket per pixel column every column keeps the
+    first, last, min and max sample, in their original order, and every
+    peak and notch survives. Where X runs back and forth, each pass through
+    a bucket is kept separately. With `xlim`, only the samples inside the
+    window (plus one on each side so the line reaches the edges) are
+    considered.
+    '''
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if xlim is not None:
+        lo, hi = min(xlim), max(xlim)
+        inside = (x >= lo) & (x <= hi)
+        inside[:-1] |= inside[1:]
+        inside[1:] |= inside[:-1]
+        x, y = x[inside], y[inside]
+    n = len(y)
+    if n <= 4 * buckets:
+        return x, y
+    forward, _ = _scale_transform(xscale)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tx = forward(x.astype(np.float64))
+        lo, hi = forward(np.asarray(sorted(xlim), dtype=float)) if xlim is not None else (np.nan, np.nan)
+    finite = np.isfinite(tx)
+    if not finite.any():
+        return x, y
+    if not (np.isfinite(lo) and np.isfinite(hi) and lo < hi):
+        lo, hi = tx[finite].min(), tx[finite].max()
+    width = (hi - lo) / buckets or 1.0
+    # Samples off the axis (NaN, or x <= 0 on a log axis) share bucket -1.
+    bucket = np.full(n, -1, dtype=np.intp)
+    bucket[finite] = np.clip((tx[finite] - lo) // width, 0, buckets - 1)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    run = np.cumsum(np.r_[False, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:] - 1, n - 1]
+    idx = np.unique(np.concatenate([starts, ends, *_run_extremes(y.astype(np.float64), starts, run)]))
+    return x[idx], y[idx]
+
+
+def pixel_width(ax):
+    dpi = max(ax.figure.dpi, RENDER_DPI)
+    return max(1, int(ax.get_position().width * ax.figure.get_figwidth() * dpi))
+
+
+def pixel_height(ax):
+    dpi = max(ax.figure.dpi, RENDER_DPI)
+    return max(1, int(ax.get_position().height * ax.figure.get_figheight() * dpi))
+
+
+def _decimatable(x, y):
+    return all(np.issubdtype(a.dtype, np.number) and not np.iscomplexobj(a) for a in (x, y))
+
+
+def plot_line(ax, x, y, **kwargs):
+    '''ax.plot() for one trace, decimated to the axes' pixel width.
+
+    The buckets follow the axes' X scale, so set it (or call set_xscale()
+    afterwards) before the figure is drawn.
+    '''
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if not _decimatable(x, y):
+        return ax.plot(x, y, **kwargs)[0]
+    line, = ax.plot(*minmax_decimate(x, y, pixel_width(ax), xscale=ax.get_xscale()), **kwargs)
+    _sources[line] = (x, y)
+    return line
+
+
+def _redecimate(ax, xlim):
+    for line in ax.lines:
+        source = _sources.get(line)
+        if source is not None:
+            line.set_data(*minmax_decimate(*source, pixel_width(ax), xlim=xlim, xscale=ax.get_xscale()))
+
+
+def set_xwindow(fig, xlim):
+    '''Re-decimate every line of the figure over the X window, then apply it.'''
+    for ax in fig.axes:
+        _redecimate(ax, xlim)
+    for ax in fig.axes:
+        ax.set_xlim(list(xlim))
+
+
+def set_xscale(ax, scale):
+    '''ax.set_xscale(), re-decimating the lines of the axes and their twins for the new scale.'''
+    ax.set_xscale(scale)
+    xlim = None if ax.get_autoscalex_on() else ax.get_xlim()
+    for shared in ax.get_shared_x_axes().get_siblings(ax):
+        _redecimate(shared, xlim)
+
+
+def _scale_transform(scale):
+    if scale == 'log':
+        return np.log10, lambda v: 10.0 ** v
+    return (lambda v: v), (lambda v: v)
+
+
+def _bin_range(values, lim, forward):
+    if lim is not None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lo, hi = forward(np.asarray(sorted(lim), dtype=float))
+        if np.isfinite(lo) and np.isfinite(hi) and lo < hi:
+            return lo, hi
+    if values.size == 0:
+        return 0.0, 1.0
+    lo, hi = values.min(), values.max()
+    if lo == hi:
+        lo, hi = lo - 0.5, hi + 0.5
+    return lo, hi
+
+
+def density_grid(x, y, xbins, ybins, xscale='linear', yscale='linear', xlim=None, ylim=None):
+    '''Count points on an xbins x ybins grid that is uniform in the axes' scales.
+
+    Returns the bin edges in data units and the counts, indexed [x, y].
+    '''
+    fx, ix = _scale_transform(xscale)
+    fy, iy = _scale_transform(yscale)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tx = fx(np.asarray(x, dtype=float))
+        ty = fy(np.asarray(y, dtype=float))
+    keep = np.isfinite(tx) & np.isfinite(ty)
+    tx, ty = tx[keep], ty[keep]
+    x0, x1 = _bin_range(tx, xlim, fx)
+    y0, y1 = _bin_range(ty, ylim, fy)
+    keep = (tx >= x0) & (tx <= x1) & (ty >= y0) & (ty <= y1)
+    tx, ty = tx[keep], ty[keep]
+    bx = np.minimum(((tx - x0) * (xbins / (x1 - x0))).astype(np.intp), xbins - 1)
+    by = np.minimum(((ty - y0) * (ybins / (y1 - y0))).astype(np.intp), ybins - 1)
+    counts = np.bincount(bx * ybins + by, minlength=xbins * ybins).reshape(xbins, ybins)
+    xedges = ix(np.linspace(x0, x1, xbins + 1))
+    yedges = iy(np.linspace(y0, y1, ybins + 1))
+    return xedges, yedges, counts
+
+
+def _draw_density(ax, x, y, xscale, yscale, xlim=None, ylim=None):
+    xbins = max(1, pixel_width(ax) // DENSITY_BIN_PX)
+    ybins = max(1, pixel_height(ax) // DENSITY_BIN_PX)
+    xedges, yedges, counts = density_grid(x, y, xbins, ybins, xscale, yscale, xlim, ylim)
+    # Empty bins stay transparent so the plot reads like a scatter.
+    counts = np.ma.masked_equal(counts.T, 0)
+    vmax = max(1, counts.max() if counts.count() else 1)
+    return ax.pcolormesh(xedges, yedges, counts, norm=LogNorm(vmin=1, vmax=vmax), shading='flat', rasterized=True)
+
+
+def plot_scatter(ax, x, y, xscale='linear', yscale='linear', max_points=SCATTER_MAX_POINTS, **kwargs):
+    '''ax.scatter(), switching to a density grid above max_points.
+
+    The grid is binned in the axes' own scales, so it has to be told whether
+    X and Y are linear or log. Its cost is one vectorized pass over the data
+    plus a fixed-size image, however many rows there are.
+    '''
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(x) <= max_points or not _decimatable(x, y):
+        kwargs.setdefault('rasterized', len(x) > RASTERIZE_POINTS)
+        return ax.scatter(x, y, **kwargs)
+    mesh = _draw_density(ax, x, y, xscale, yscale)
+    ax.figure.colorbar(mesh, ax=ax, label='Points per bin')
+    # The colorbar stays reachable through mesh.colorbar; holding it here
+    # would keep the weak key (its mappable) and the arrays alive for good.
+    _sources[mesh] = (x, y, xscale, yscale)
+    return mesh
+
+
+def set_scatter_window(ax, xlim, ylim):
+    '''Apply axis limits, re-binning any density grid over just that window.'''
+    for collection in list(ax.collections):
+        source = _sources.pop(collection, None)
+        if source is None:
+            continue
+        colorbar = collection.colorbar
+        collection.remove()
+        mesh = _draw_density(ax, *source, xlim, ylim)
+        colorbar.update_normal(mesh)
+        mesh.colorbar = colorbar
+        _sources[mesh] = source
+    if xlim is not None:
+        ax.set_xlim(list(xlim))
+    if ylim is not None:
+        ax.set_ylim(list(ylim))
+
+
+def figure_png(fig, dpi=RENDER_DPI):
+    '''Rasterize a figure the way st.pyplot does.'''
+    buf = BytesIO()
+    fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+    return buf.getvalue()
@@ -0,0 +1,256 @@
+import csv
+import io
+import os
+import zipfile
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+
+# Rows per chunk when streaming text formats; bounds the temporary memory
+# used while parsing, independent of the file size.
+CHUNK_ROWS = 100_000
+
+TOUCHSTONE_EXTENSIONS = ['ts'] + [f's{n}p' for n in range(1, 17)]
+UPLOAD_TYPES = ['xlsx', 'csv'] + TOUCHSTONE_EXTENSIONS
+
+FREQUENCY_UNITS = {'HZ': 1.0, 'KHZ': 1e3, 'MHZ': 1e6, 'GHZ': 1e9}
+
+
+def is_workbook(name):
+    return os.path.splitext(name)[1].lower() == '.xlsx'
+
+
+def sheet_names(data):
+    '''Sheet names of an xlsx workbook, read from its metadata without parsing any cells.
+
+    `data` is the workbook's bytes or a path to it.
+    '''
+    with zipfile.ZipFile(data if isinstance(data, (str, os.PathLike)) else io.BytesIO(data)) as archive:
+        root = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    return [sheet.get('name') for sheet in root.iterfind('{*}sheets/{*}sheet')]
+
+
+def read_workbook(data, sheet=None):
+    return pd.read_excel(io.BytesIO(data), sheet_name=sheet if sheet is not None else 0)
+
+
+def read_upload(data, name, sheet=None):
+    '''Parse an uploaded file into a DataFrame, choosing the reader by extension.
+
+    `sheet` selects a workbook sheet by name; the first sheet by default.
+    '''
+    ext = os.path.splitext(name)[1].lower().lstrip('.')
+    if ext == 'csv':
+        return read_csv(data)
+    if ext in TOUCHSTONE_EXTENSIONS:
+        return read_touchstone(data, ext)
+    return read_workbook(data, sheet)
+
+
+def _text_lines(data):
+    return io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', errors='replace', newline='')
+
+
+def _is_number(field):
+    try:
+        float(field)
+    except ValueError:
+        return False
+    return True
+
+
+def _sniff_delimiter(lines):
+    # csv.Sniffer gives up on instrument preambles and END trailers, so pick
+    # the delimiter that splits most of the body lines into the same number
+    # of fields.
+    body = [line for line in lines[-50:] if line.strip()]
+    best, best_score = ',', 0
+    for delimiter in (',', ';', '\t'):
+        counts = [line.count(delimiter) for line in body]
+        # Ties go to the larger count: preamble and trailer lines without
+        # the delimiter must not outvote a short body.
+        mode = max(set(counts), key=lambda c: (counts.count(c), c)) if counts else 0
+        score = counts.count(mode) if mode else 0
+        if score > best_score:
+            best, best_score = delimiter, score
+    return best
+
+
+def _find_header(lines, delimiter):
+    '''Locate the header row and first data row among an instrument's preamble.
+
+    Returns (header_row or None, first_data_row). A row is data when most of
+    its fields are numeric; the header is the row right before the first data
+    row, if it has the same number of fields and none of them is numeric.
+    '''
+    rows = list(csv.reader(lines, delimiter=delimiter))
+    for i, row in enumerate(rows):
+        fields = [f.strip() for f in row if f.strip()]
+        numeric = sum(_is_number(f) for f in fields)
+        if numeric and 2 * numeric >= len(fields):
+            previous = rows[i - 1] if i > 0 else []
+            if len(previous) == len(row) and not any(_is_number(f) for f in previous if f.strip()):
+                return i - 1, i
+            return None, i
+    raise ValueError('no numeric data rows found in CSV file')
+
+
+def _numeric_column(values):
+    # Genuinely textual columns have no numeric values at all.
+    return values.isna().all() or pd.to_numeric(values, errors='coerce').notna().any()
+
+
+def read_csv(data, chunk_rows=CHUNK_ROWS):
+    '''Stream a CSV export into typed columns.
+
+    Instrument preambles above the header are skipped and the delimiter is
+    detected. Whether a column is numeric is decided once, from the sampled
+    start of the file; numeric columns are parsed as float64 chunk by chunk,
+    the rest are kept as text. Trailer lines such as END become NaN rows and
+    are dropped.
+    '''
+    sample = data[:64 * 1024].decode('utf-8', errors='replace')
+    lines = sample.splitlines()
+    if len(data) > 64 * 1024:
+        # The last sampled line may be cut off.
+        lines = lines[:-1]
+    delimiter = _sniff_delimiter(lines)
+    header_row, data_row = _find_header(lines, delimiter)
+    names = None
+    if header_row is None:
+        width = len(next(csv.reader([lines[data_row]], delimiter=delimiter)))
+        names = [f'Column {i + 1}' for i in range(width)]
+    options = dict(
+        sep=delimiter,
+        skiprows=header_row if header_row is not None else data_row,
+        header=None if names else 0,
+        names=names,
+        skipinitialspace=True,
+    )
+    # Decided per column up front, so every chunk converts the same way and
+    # the result does not depend on the chunk size.
+    sample_df = pd.read_csv(io.StringIO('\n'.join(lines)), **options)
+    text = [c for c in sample_df.columns if not _numeric_column(sample_df[c])]
+    reader = pd.read_csv(_text_lines(data), chunksize=chunk_rows, dtype={c: str for c in text}, **options)
+    chunks = []
+    for chunk in reader:
+        for column in chunk.columns:
+            if column not in text and chunk[column].dtype != np.float64:
+                chunk[column] = pd.to_numeric(chunk[column], errors='coerce').astype(np.float64)
+        chunks.append(chunk.dropna(how='all'))
+    df = pd.concat(chunks, ignore_index=True)
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+
+def _parse_option_line(line):
+    # Defaults from the Touchstone specification.
+    options = {'unit': 'GHZ', 'parameter': 'S', 'format': 'MA', 'resistance': 50.0}
+    tokens = line[1:].upper().split()
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in FREQUENCY_UNITS:
+            options['unit'] = token
+        elif token in ('S', 'Y', 'Z', 'H', 'G'):
+            options['parameter'] = token
+        elif token in ('DB', 'MA', 'RI'):
+            options['format'] = token
+        elif token == 'R' and i + 1 < len(tokens):
+            options['resistance'] = float(tokens[i + 1])
+            i += 1
+        i += 1
+    return options
+
+
+def _to_complex(a, b, fmt):
+    if fmt == 'RI':
+        return a + 1j * b
+    magnitude = 10 ** (a / 20) if fmt == 'DB' else a
+    return magnitude * np.exp(1j * np.deg2rad(b))
+
+
+def read_touchstone(data, ext='s2p', chunk_rows=CHUNK_ROWS):
+    '''Stream a Touchstone v1 or v2 file into a frequency column plus complex parameters.
+
+    Frequencies are converted to Hz. Each parameter gets a complex column
+    (e.g. S21) and a pair of float columns in the file's own format
+    (S21 dB / S21 deg, S21 mag / S21 deg, or S21 re / S21 im). Noise data
+    is ignored.
+    '''
+    ports = int(ext[1:-1]) if ext != 'ts' else None
+    options = None
+    keywords = {}
+    chunks = []
+    pending = []
+    width = None
+    reference = None
+    for raw in _text_lines(data):
+        line = raw.split('!', 1)[0].strip()
+        if not line:
+            continue
+        if line.startswith('#'):
+            if options is None:
+                options = _parse_option_line(line)
+            continue
+        if line.startswith('['):
+            keyword, _, value = line[1:].partition(']')
+            keyword = keyword.strip().lower()
+            if keyword in ('noise data', 'end'):
+                break
+            keywords[keyword] = value.strip()
+            if keyword == 'number of ports':
+                ports = int(value)
+            elif keyword == 'reference':
+                reference = value.split()
+            continue
+        # [Reference] gives one impedance per port and may wrap onto the
+        # following lines, which are not network data.
+        if reference is not None and ports is not None and len(reference) < ports:
+            reference += line.split()
+            continue
+        if width is None:
+            if ports is None:
+                raise ValueError('Touchstone file does not give the number of ports')
+            lower = keywords.get('matrix format', 'full').lower() in ('lower', 'upper')
+            pairs = ports * (ports + 1) // 2 if lower else ports * ports
+            width = 1 + 2 * pairs
+        # Version 1 two-port files append noise data as 5-value lines.
+        if ports == 2 and 'version' not in keywords and len(line.split()) == 5:
+            break
+        pending.append(line)
+        if len(pending) >= chunk_rows:
+            chunks.append(np.fromstring(' '.join(pending), sep=' '))
+            pending = []
+    if pending:
+        chunks.append(np.fromstring(' '.join(pending), sep=' '))
+    if width is None:
+        raise ValueError('no network data found in Touchstone file')
+    values = np.concatenate(chunks)
+    if values.size % width:
+        raise ValueError(f'Touchstone data does not divide into rows of {width} values')
+    values = values.reshape(-1, width)
+
+    options = options or _parse_option_line('#')
+    matrix = keywords.get('matrix format', 'full').lower()
+    if ports == 2 and matrix == 'full' and keywords.get('two-port data order', '21_12') == '21_12':
+        order = [(1, 1), (2, 1), (1, 2), (2, 2)]
+    elif matrix == 'lower':
+        order = [(i, j) for i in range(1, ports + 1) for j in range(1, i + 1)]
+    elif matrix == 'upper':
+        order = [(i, j) for i in range(1, ports + 1) for j in range(i, ports + 1)]
+    else:
+        order = [(i, j) for i in range(1, ports + 1) for j in range(1, ports + 1)]
+
+    fmt = options['format']
+    suffixes = {'DB': ('dB', 'deg'), 'MA': ('mag', 'deg'), 'RI': ('re', 'im')}[fmt]
+    columns = {'Frequency (Hz)': values[:, 0] * FREQUENCY_UNITS[options['unit']]}
+    for k, (i, j) in enumerate(order):
+        name = f"{options['parameter']}{i}{j}" if ports < 10 else f"{options['parameter']}{i},{j}"
+        a = values[:, 1 + 2 * k]
+        b = values[:, 2 + 2 * k]
+        columns[name] = _to_complex(a, b, fmt)
+        columns[f'{name} {suffixes[0]}'] = a
+        columns[f'{name} {suffixes[1]}'] = b
+    return pd.DataFrame(columns)
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import threading
+from io import StringIO
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+SIDECAR_DIR = os.environ.get('RFENG_SIDECAR_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'rfeng'))
+SIDECAR_MAX_BYTES = int(float(os.environ.get('RFENG_SIDECAR_MB', 4096)) * 1024 * 1024)
+SUMMARY_KEY = b'rfeng.summary'
+
+
+class SidecarTable:
+    '''A Feather file on disk, read column by column through a memory map.'''
+
+    def __init__(self, path):
+        self.path = path
+        # Only the footer and batch headers are touched here; no column data is read.
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            schema = reader.schema
+            self.num_rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        self.headers = schema.names
+        summary = (schema.metadata or {}).get(SUMMARY_KEY)
+        self.summary = pd.read_json(StringIO(summary.decode()), orient='split') if summary else None
+
+    def read(self, columns):
+        table = feather.read_table(self.path, columns=list(columns), memory_map=True)
+        return table.to_pandas()
+
+    def read_rows(self, start, stop, columns):
+        # Slicing the memory-mapped table converts just the requested rows.
+        table = feather.read_table(self.path, columns=list(columns), memory_map=True)
+        return table.slice(start, max(0, stop - start)).to_pandas()
+
+
+class SidecarStore:
+    '''Directory of Feather sidecars keyed by workbook hash, capped in size with LRU cleanup.'''
+
+    def __init__(self, directory=SIDECAR_DIR, max_bytes=SIDECAR_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.feather')
+
+    def open(self, key):
+        path = self.path(key)
+        try:
+            table = SidecarTable(path)
+        except (OSError, pa.ArrowException):
+            self.misses += 1
+            return None
+        self.hits += 1
+        # mtime doubles as the last-used time for LRU cleanup.
+        os.utime(path)
+        return table
+
+    def write(self, key, df, summary=None):
+        '''Write a sidecar, storing the column summary (if given) in the file's metadata.'''
+        # Arrow needs string column names; anything else stays xlsx-only.
+        if not all(isinstance(c, str) for c in df.columns):
+            return False
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowException, TypeError, ValueError):
+            return False
+        if summary is not None:
+            metadata = dict(table.schema.metadata or {})
+            metadata[SUMMARY_KEY] = summary.to_json(orient='split').encode()
+            table = table.replace_schema_metadata(metadata)
+        # Uncompressed so the file can be memory-mapped without decoding.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            feather.write_feather(table, tmp, compression='uncompressed')
+            os.replace(tmp, self.path(key))
+        except (OSError, pa.ArrowException):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        self.cleanup()
+        return True
+
+    def cleanup(self):
+        with self._lock:
+            files = []
+            for name in os.listdir(self.directory):
+                if not name.endswith('.feather'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            # Oldest first, but never remove the file that was just written.
+            for _, size, path in files[:-1]:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
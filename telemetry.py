@@ -0,0 +1,200 @@
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the latency histogram buckets, Prometheus style.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Recent samples kept per stage for the sidebar's percentiles.
+RECENT_SAMPLES = 512
+METRICS_HOST = os.environ.get('RFENG_METRICS_HOST', '127.0.0.1')
+# 0 turns the endpoint off.
+METRICS_PORT = int(os.environ.get('RFENG_METRICS_PORT', 9464))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+
+class Telemetry:
+    '''Process-wide stage timings, event counters, cache hit rates and gauges.
+
+    Every session records into the same instance, so the numbers describe
+    the server as a whole under its real load.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._events = {}
+        self._caches = {}
+        self._gauges = {}
+        self.started = time.time()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, event, n=1):
+        with self._lock:
+            self._events[event] = self._events.get(event, 0) + n
+
+    def register_cache(self, name, cache):
+        '''Report an object's `hits` and `misses` counters as a cache.'''
+        self._caches[name] = cache
+        return cache
+
+    def register_gauge(self, name, read):
+        self._gauges[name] = read
+
+    def snapshot(self):
+        with self._lock:
+            stages = {}
+            for stage, h in self._stages.items():
+                recent = sorted(h.recent)
+                stages[stage] = {
+                    'count': h.count,
+                    'sum': h.sum,
+                    'mean': h.sum / h.count,
+                    'p50': recent[len(recent) // 2],
+                    'p95': recent[min(len(recent) - 1, int(len(recent) * 0.95))],
+                    'max': h.max,
+                    'buckets': dict(zip([*map(str, BUCKETS), '+Inf'], _cumulative(h.counts))),
+                }
+            events = dict(self._events)
+        caches = {}
+        for name, cache in self._caches.items():
+            total = cache.hits + cache.misses
+            caches[name] = {'hits': cache.hits, 'misses': cache.misses, 'hit_rate': cache.hits / total if total else None}
+        return {
+            'uptime_seconds': time.time() - self.started,
+            'rss_bytes': rss_bytes(),
+            'stages': stages,
+            'events': events,
+            'caches': caches,
+            'gauges': {name: read() for name, read in self._gauges.items()},
+        }
+
+    def prometheus(self):
+        '''The snapshot in the Prometheus text exposition format.'''
+        snap = self.snapshot()
+        lines = [
+            '# HELP rfeng_stage_seconds Time spent in each dashboard stage.',
+            '# TYPE rfeng_stage_seconds histogram',
+        ]
+        for stage, s in snap['stages'].items():
+            label = f'stage="{_escape(stage)}"'
+            for le, n in s['buckets'].items():
+                lines.append(f'rfeng_stage_seconds_bucket{{{label},le="{le}"}} {n}')
+            lines.append(f'rfeng_stage_seconds_sum{{{label}}} {s["sum"]}')
+            lines.append(f'rfeng_stage_seconds_count{{{label}}} {s["count"]}')
+        lines += ['# HELP rfeng_events_total Counted dashboard events.', '# TYPE rfeng_events_total counter']
+        lines += [f'rfeng_events_total{{event="{_escape(e)}"}} {n}' for e, n in snap['events'].items()]
+        lines += ['# HELP rfeng_cache_hits_total Cache lookups that hit.', '# TYPE rfeng_cache_hits_total counter']
+        lines += [f'rfeng_cache_hits_total{{cache="{_escape(c)}"}} {s["hits"]}' for c, s in snap['caches'].items()]
+        lines += ['# HELP rfeng_cache_misses_total Cache lookups that missed.', '# TYPE rfeng_cache_misses_total counter']
+        lines += [f'rfeng_cache_misses_total{{cache="{_escape(c)}"}} {s["misses"]}' for c, s in snap['caches'].items()]
+        for name, value in snap['gauges'].items():
+            lines += [f'# TYPE rfeng_{name} gauge', f'rfeng_{name} {value}']
+        if snap['rss_bytes'] is not None:
+            lines += [
+                '# HELP rfeng_process_resident_memory_bytes Resident set size of the server process.',
+                '# TYPE rfeng_process_resident_memory_bytes gauge',
+                f'rfeng_process_resident_memory_bytes {snap["rss_bytes"]}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+def _cumulative(counts):
+    total = 0
+    for n in counts:
+        total += n
+        yield total
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def rss_bytes():
+    '''Current resident set size; the peak where /proc is not available, None on Windows.'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+telemetry = Telemetry()
+timed = telemetry.timed
+count = telemetry.count
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = telemetry.prometheus().encode(), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body, content_type = json.dumps(telemetry.snapshot(), indent=2).encode(), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(host=METRICS_HOST, port=METRICS_PORT):
+    '''Serve /metrics (Prometheus text) and /metrics.json from a background thread.
+
+    Returns the server, or None if the endpoint is turned off or the port is
+    already taken (e.g. by another dashboard process on the same host).
+    '''
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError:
+        return None
+    threading.Thread(target=server.serve_forever, name='rfeng-metrics', daemon=True).start()
+    return server